@@ -0,0 +1,410 @@
+'''
+Benchmarks for the hot paths of pkgtools: archive loading, metadata parsing, working set
+scans and the PyPI clients. Everything runs offline: the fixtures (eggs, sdists, metadata
+directories and a site-packages tree) are generated in a temporary directory and the PyPI
+clients talk to a stub JSON/XML-RPC server on localhost.
+
+Usage::
+
+    $ python benchmarks/bench.py --output results.json
+    $ python benchmarks/bench.py --baseline results.json   # Compare with a previous run
+
+The results are written as JSON. When a baseline is given, every benchmark whose median
+is more than *threshold* slower than the baseline is reported as a regression, and the
+script exits with status 1.
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import tarfile
+import argparse
+import platform
+import tempfile
+import threading
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from xmlrpc.server import SimpleXMLRPCDispatcher
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pkgtools
+from pkgtools.pkg import Egg, SDist, Dir, MetadataFileParser, WorkingSet, get_metadata
+from pkgtools.pypi import HTTPClient, PyPIJson, PyPIXmlRpc
+
+
+## Fixtures
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'util', 'core', 'http', 'json', 'tools', 'async')
+
+
+class Fixtures(object):
+    '''
+    Generates the synthetic distributions. *scale* multiplies the number of members and
+    distributions, and *seed* makes the content reproducible.
+    '''
+
+    def __init__(self, root, scale=1, seed=42):
+        self.root = root
+        self.scale = scale
+        self.random = random.Random(seed)
+
+    def name(self, i):
+        return 'bench{0}_{1}'.format(self.random.choice(WORDS), i)
+
+    def metadata(self, name, version, sources):
+        r = self.random
+        requires = ['{0}>={1}.{2}'.format(r.choice(WORDS), r.randint(0, 9), r.randint(0, 20))
+                    for _ in range(r.randint(1, 8))]
+        files = {
+            'PKG-INFO': '\n'.join([
+                'Metadata-Version: 1.1',
+                'Name: {0}'.format(name),
+                'Version: {0}'.format(version),
+                'Summary: The {0} package'.format(name),
+                'Home-page: http://example.com/{0}'.format(name),
+                'Author: Jane Doe',
+                'Author-email: jane@example.com',
+                'License: MIT',
+                'Description: {0}'.format('\n        '.join(r.choice(WORDS) * 3 for _ in range(40))),
+                'Platform: any',
+            ] + ['Classifier: Topic :: {0}'.format(w.capitalize()) for w in WORDS]) + '\n',
+            'requires.txt': '\n'.join(requires) + '\n\n[test]\nnose>=1.0\n',
+            'entry_points.txt': '[console_scripts]\n{0} = {0}:main\n\n[{0}.plugins]\n{1}\n'.format(
+                name, '\n'.join('p{0} = {1}.plugins:p{0}'.format(i, name) for i in range(20))),
+            'SOURCES.txt': '\n'.join('{0}/{1}_{2}.py'.format(name, r.choice(WORDS), i)
+                                     for i in range(sources)) + '\n',
+            'top_level.txt': name + '\n',
+            'dependency_links.txt': '\n',
+        }
+        return files
+
+    def egg(self, name, version, sources, members):
+        path = os.path.join(self.root, '{0}-{1}-py2.7.egg'.format(name, version))
+        files = self.metadata(name, version, sources)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+            for i in range(members):
+                z.writestr('{0}/module_{1}.py'.format(name, i), '# module {0}\n'.format(i) * 50)
+            for fname, data in files.items():
+                z.writestr('EGG-INFO/' + fname, data)
+        return path
+
+    def sdist(self, name, version, sources, members, fmt):
+        base = '{0}-{1}'.format(name, version)
+        files = self.metadata(name, version, sources)
+        entries = [('{0}/{1}/module_{2}.py'.format(base, name, i), '# module {0}\n'.format(i) * 50)
+                   for i in range(members)]
+        entries.append(('{0}/PKG-INFO'.format(base), files['PKG-INFO']))
+        entries.extend(('{0}/{1}.egg-info/{2}'.format(base, name, f), d) for f, d in files.items())
+        if fmt == 'zip':
+            path = os.path.join(self.root, base + '.zip')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+                for n, d in entries:
+                    z.writestr(n, d)
+            return path
+        path = os.path.join(self.root, base + '.tar.gz')
+        staging = os.path.join(self.root, 'staging-' + base)
+        for n, d in entries:
+            target = os.path.join(staging, n)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            with open(target, 'w') as fobj:
+                fobj.write(d)
+        with tarfile.open(path, 'w:gz') as t:
+            t.add(os.path.join(staging, base), base)
+        shutil.rmtree(staging)
+        return path
+
+    def egg_info(self, directory, name, version, sources):
+        path = os.path.join(directory, '{0}-{1}.egg-info'.format(name, version))
+        os.makedirs(path)
+        for fname, data in self.metadata(name, version, sources).items():
+            with open(os.path.join(path, fname), 'w') as fobj:
+                fobj.write(data)
+        return path
+
+    def site_packages(self, count):
+        path = os.path.join(self.root, 'site-packages-{0}'.format(count))
+        os.makedirs(path)
+        for i in range(count):
+            name = self.name(i)
+            os.makedirs(os.path.join(path, name))
+            with open(os.path.join(path, name, '__init__.py'), 'w') as fobj:
+                fobj.write('')
+            self.egg_info(path, name, '1.{0}'.format(i), 20)
+        return path
+
+    def build(self):
+        s = self.scale
+        self.eggs = {
+            'small': self.egg('smallegg', '1.0', 10 * s, 5 * s),
+            'large': self.egg('largeegg', '1.0', 2000 * s, 500 * s),
+        }
+        self.sdists = {}
+        for fmt in ('tar.gz', 'zip'):
+            self.sdists['small-' + fmt] = self.sdist('smallsdist', '1.0', 10 * s, 5 * s, fmt)
+            self.sdists['large-' + fmt] = self.sdist('largesdist', '1.0', 2000 * s, 500 * s, fmt)
+        self.dir = self.egg_info(self.root, 'benchdir', '1.0', 200 * s)
+        self.site = {
+            'small': self.site_packages(20 * s),
+            'large': self.site_packages(200 * s),
+        }
+        return self
+
+
+## Stub PyPI server
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _release(name, version, urls):
+    return {
+        'info': {'name': name, 'version': version, 'summary': 'The {0} package'.format(name)},
+        'urls': [{'filename': '{0}-{1}-{2}.tar.gz'.format(name, version, i), 'md5_digest': 'd41d8cd98f00b204',
+                  'url': 'http://localhost/packages/{0}-{1}-{2}.tar.gz'.format(name, version, i)}
+                 for i in range(urls)],
+        'releases': dict(('{0}.{1}'.format(i // 10, i % 10), []) for i in range(100)),
+    }
+
+
+def stub_server():
+    '''
+    Starts the stub index in a thread and returns ``(server, base_url)``. It serves the Json
+    API at ``/pypi/<name>[/<version>]/json`` and the XML-RPC API at ``/pypi``.
+    '''
+
+    dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+    packages = ['package{0}'.format(i) for i in range(5000)]
+    dispatcher.register_function(lambda: packages, 'list_packages')
+    dispatcher.register_function(lambda name, show_hidden=False: ['1.0', '1.1', '2.0'], 'package_releases')
+    dispatcher.register_function(lambda name, version: _release(name, version, 1)['info'], 'release_data')
+    dispatcher.register_multicall_functions()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        ## Headers and body are written separately: with Nagle's algorithm every response
+        ## on a kept-alive connection would wait for the client's delayed ACK
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) in (3, 4) and parts[0] == 'pypi' and parts[-1] == 'json':
+                version = parts[2] if len(parts) == 4 else '2.0'
+                body = json.dumps(_release(parts[1], version, 20)).encode('utf-8')
+                return self._send(200, body, 'application/json')
+            self._send(404, b'Not Found', 'text/plain')
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers['Content-Length']))
+            body = dispatcher._marshaled_dispatch(data)
+            self._send(200, body, 'text/xml')
+
+    server = _Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+
+## Timing
+
+try:
+    _clock = time.perf_counter
+except AttributeError:
+    _clock = time.time
+
+def measure(func, repeat, min_time):
+    ## Calls *func* enough times for each run to last at least *min_time* seconds,
+    ## then returns the statistics of the time per call over *repeat* runs
+    number = 1
+    while True:
+        start = _clock()
+        for _ in range(number):
+            func()
+        elapsed = _clock() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = _clock()
+        for _ in range(number):
+            func()
+        times.append((_clock() - start) / number)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times) // 2], 'max': times[-1], 'number': number}
+
+
+def benchmarks(fx, base_url):
+    '''
+    Yields the ``(name, function)`` pairs to time.
+    '''
+
+    for size, path in sorted(fx.eggs.items()):
+        yield 'Egg[{0}]'.format(size), lambda path=path: Egg(path)
+        yield 'Egg[{0},lazy]'.format(size), lambda path=path: Egg(path, lazy=True).as_req
+        yield 'Egg[{0},mmap]'.format(size), lambda path=path: Egg(path, mmap=True)
+    for kind, path in sorted(fx.sdists.items()):
+        yield 'SDist[{0}]'.format(kind), lambda path=path: SDist(path)
+        yield 'SDist[{0},members]'.format(kind), lambda path=path: SDist(path, members=['PKG-INFO'])
+    yield 'Dir', lambda: Dir(fx.dir)
+    yield 'Dir[lazy]', lambda: Dir(fx.dir, lazy=True).as_req
+
+    for name in sorted(os.listdir(fx.dir)):
+        if name not in MetadataFileParser('', 'PKG-INFO').MAP:
+            continue
+        with open(os.path.join(fx.dir, name)) as fobj:
+            data = fobj.read()
+        yield 'MetadataFileParser[{0}]'.format(name), lambda data=data, name=name: MetadataFileParser(data, name).parse()
+
+    for size, path in sorted(fx.site.items()):
+        yield 'WorkingSet[{0},fast]'.format(size), lambda path=path: WorkingSet([path], fast=True)
+
+    yield 'get_metadata[egg]', lambda: get_metadata(fx.eggs['small'])
+    yield 'get_metadata[sdist]', lambda: get_metadata(fx.sdists['small-tar.gz'])
+    yield 'get_metadata[dir]', lambda: get_metadata(fx.dir)
+    package = sorted(d for d in os.listdir(fx.site['small']) if not d.endswith('.egg-info'))[0]
+    yield 'get_metadata[installed]', lambda: get_metadata(package)
+    yield 'get_metadata[installed,no_import]', lambda: get_metadata(package, no_import=True)
+
+    client = HTTPClient()
+    def pypi_json(pooled):
+        pypi = PyPIJson('benchpkg', fast=True, client=client if pooled else None)
+        pypi.URL = base_url + '/pypi/{0}/json'
+        return pypi
+    yield 'PyPIJson.retrieve', lambda: pypi_json(False).retrieve()
+    yield 'PyPIJson.retrieve[pooled]', lambda: pypi_json(True).retrieve()
+    yield 'PyPIJson.find', lambda: list(pypi_json(False).find('1.0'))
+    yield 'PyPIJson.find[pooled]', lambda: list(pypi_json(True).find('1.0'))
+    xmlrpc = PyPIXmlRpc(base_url + '/pypi', client=client)
+    yield 'PyPIXmlRpc.package_releases', lambda: xmlrpc.package_releases('benchpkg')
+    yield 'PyPIXmlRpc.list_packages', lambda: xmlrpc.list_packages()
+    yield 'PyPIXmlRpc.release_data_many', lambda: xmlrpc.release_data_many(
+        [('package{0}'.format(i), '1.0') for i in range(100)])
+
+
+def compare(results, baseline, threshold):
+    '''
+    Returns the rows of the comparison table and the names of the regressions.
+    '''
+
+    rows, regressions = [], []
+    for name, result in sorted(results.items()):
+        old = baseline.get(name)
+        if 'error' in result:
+            ## A benchmark which started failing is a regression too
+            status = ''
+            if old is None or 'error' not in old:
+                status = 'ERROR'
+                regressions.append(name)
+            rows.append((name, None, old and old.get('median'), None, status))
+            continue
+        if old is None or 'error' in old:
+            rows.append((name, result['median'], None, None, ''))
+            continue
+        ratio = result['median'] / old['median'] if old['median'] else 1.0
+        status = ''
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'improved'
+        rows.append((name, result['median'], old['median'], ratio, status))
+    return rows, regressions
+
+
+def _format_time(t):
+    if t is None:
+        return '-'
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if t * factor >= 1:
+            return '{0:.2f}{1}'.format(t * factor, unit)
+    return '{0:.0f}ns'.format(t * 1e9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark pkgtools offline.')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('-b', '--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as a regression (default: 0.2)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='runs per benchmark (default: 5)')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='minimum duration of a run, in seconds (default: 0.05)')
+    parser.add_argument('-s', '--scale', type=int, default=1, help='size multiplier of the fixtures')
+    parser.add_argument('-k', '--filter', help='run only the benchmarks whose name contains this string')
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='pkgtools-bench-')
+    server = None
+    try:
+        fx = Fixtures(root, args.scale).build()
+        sys.path.insert(0, fx.site['small'])
+        server, base_url = stub_server()
+        results = {}
+        for name, func in benchmarks(fx, base_url):
+            if args.filter and args.filter not in name:
+                continue
+            try:
+                results[name] = measure(func, args.repeat, args.min_time)
+            except Exception as e:
+                results[name] = {'error': '{0}: {1}'.format(e.__class__.__name__, e)}
+            result = results[name]
+            print('{0:<40} {1}'.format(name, result.get('error') or _format_time(result['median'])))
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+    output = {
+        'meta': {
+            'pkgtools': pkgtools.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scale': args.scale,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fobj:
+            json.dump(output, fobj, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as fobj:
+            baseline = json.load(fobj)['results']
+        rows, regressions = compare(results, baseline, args.threshold)
+        print('\n{0:<40} {1:>10} {2:>10} {3:>7}'.format('benchmark', 'baseline', 'current', 'ratio'))
+        for name, new, old, ratio, status in rows:
+            print('{0:<40} {1:>10} {2:>10} {3:>7} {4}'.format(
+                name, _format_time(old), _format_time(new), '-' if ratio is None else '{0:.2f}'.format(ratio), status))
+        if regressions:
+            print('\n{0} regression(s): {1}'.format(len(regressions), ', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+'''
+An asyncio interface to the PyPI Json API, to retrieve the metadata of many packages
+concurrently. This module requires Python 3.6 or later.
+'''
+
+import ssl
+import json
+import asyncio
+import collections
+import urllib.error
+import urllib.parse
+
+from .pypi import PyPIJson, _releases
+from .instrument import span
+
+
+class AsyncHTTPClient(object):
+    '''
+    A minimal HTTP/1.1 client built on asyncio streams. It keeps up to *pool_size* idle
+    connections for every host and follows redirects. *timeout* (in seconds) applies to
+    every request.
+
+    .. automethod:: fetch
+
+    .. automethod:: close
+    '''
+
+    REDIRECTS = (301, 302, 303, 307, 308)
+
+    def __init__(self, pool_size=64, timeout=None, max_redirects=5):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._pools = collections.defaultdict(list)
+
+    def __repr__(self):
+        return '<AsyncHTTPClient[{0}] object at {1}>'.format(self.pool_size, id(self))
+
+    async def _acquire(self, key):
+        pool = self._pools[key]
+        if pool:
+            return pool.pop() + (True,)
+        scheme, host, port = key
+        context = ssl.create_default_context() if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=context)
+        return reader, writer, False
+
+    def _release(self, key, reader, writer):
+        pool = self._pools[key]
+        if len(pool) < self.pool_size:
+            pool.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _read_response(self, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by the server')
+        version, status, reason = (line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    ## Skip the trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), reason, headers, body, keep_alive
+
+    async def _request(self, url):
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request = ('GET {0} HTTP/1.1\r\nHost: {1}\r\nAccept: application/json\r\n'
+                   'Accept-Encoding: identity\r\n\r\n').format(path, parts.netloc).encode('latin-1')
+        while True:
+            reader, writer, reused = await self._acquire(key)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, reason, headers, body, keep_alive = await self._read_response(reader)
+            except BaseException as e:
+                ## Also on timeouts and cancellations, which leave the connection in an unknown state
+                writer.close()
+                ## The server may have closed an idle connection: retry with a new one
+                if reused and isinstance(e, (OSError, asyncio.IncompleteReadError)):
+                    continue
+                raise
+            break
+        if keep_alive:
+            self._release(key, reader, writer)
+        else:
+            writer.close()
+        return status, reason, headers, body
+
+    async def fetch(self, url):
+        '''
+        Retrieves *url* and returns the response body. Raises :exc:`urllib.error.HTTPError`
+        when the server responds with an error status.
+        '''
+
+        for i in range(self.max_redirects + 1):
+            with span('pypi.http', method='GET', url=url):
+                if self.timeout is None:
+                    status, reason, headers, body = await self._request(url)
+                else:
+                    status, reason, headers, body = await asyncio.wait_for(self._request(url), self.timeout)
+            if status not in self.REDIRECTS or 'location' not in headers:
+                break
+            url = urllib.parse.urljoin(url, headers['location'])
+        else:
+            raise urllib.error.HTTPError(url, status, 'Too many redirects', headers, None)
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, reason, headers, None)
+        return body
+
+    def close(self):
+        '''
+        Closes all the idle connections.
+        '''
+
+        pools, self._pools = self._pools, collections.defaultdict(list)
+        for conns in pools.values():
+            for reader, writer in conns:
+                writer.close()
+
+
+class AsyncPyPIJson(object):
+    '''
+    Retrieves the Json metadata of many packages concurrently::
+
+        >>> async def main():
+        ...     pypi = AsyncPyPIJson()
+        ...     async for name, release in pypi.find_many(['pyg', 'pkgtools'], ['0.4', '0.6.2']):
+        ...         print(name, release)
+        ...     pypi.close()
+        >>> asyncio.get_event_loop().run_until_complete(main())
+        pkgtools ('0.6.2', 'pkgtools-0.6.2.tar.gz', '...', 'http://pypi.python.org/packages/source/p/pkgtools/pkgtools-0.6.2.tar.gz', '.tar.gz')
+        pyg ('0.4', 'pyg-0.4.tar.gz', '...', 'http://pypi.python.org/packages/source/p/pyg/pyg-0.4.tar.gz', '.tar.gz')
+
+    Package names must be the real names (see :func:`pkgtools.pypi.real_name`).
+    *url* is the Json API URL template (by default :attr:`PyPIJson.URL`), so that a local index
+    can be used. *transport* is a coroutine function which receives an URL and returns the
+    response body; by default the requests are sent through an :class:`AsyncHTTPClient`.
+
+    .. automethod:: retrieve
+
+    .. automethod:: retrieve_many
+
+    .. automethod:: find_many
+    '''
+
+    def __init__(self, url=None, transport=None, timeout=None):
+        self.url = url or PyPIJson.URL
+        self._client = None
+        if transport is None:
+            self._client = AsyncHTTPClient(timeout=timeout)
+            transport = self._client.fetch
+        self.transport = transport
+
+    def __repr__(self):
+        return '<AsyncPyPIJson[{0}] object at {1}>'.format(self.url, id(self))
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    async def retrieve(self, package_name, version=None):
+        '''
+        Retrieves the raw data of *package_name* and loads the JSON into a Python dictionary,
+        like :meth:`PyPIJson.retrieve`.
+        '''
+
+        url = self.url.format(package_name + ('/{0}'.format(version) if version else ''))
+        data = await self.transport(url)
+        return json.loads(data.decode('utf-8'))
+
+    async def retrieve_many(self, names, versions=None, concurrency=64, onerror=None):
+        '''
+        Retrieves the data of all the packages in *names* (optionally, the releases in
+        *versions*, a sequence parallel to *names*) with at most *concurrency* requests at
+        a time. Yields ``(name, data)`` tuples as soon as they are ready.
+        When a package cannot be retrieved, *onerror* is called with its name and the exception.
+        '''
+
+        jobs = iter(zip(names, versions) if versions is not None else ((n, None) for n in names))
+        results = asyncio.Queue()
+        finished = object()
+
+        async def worker():
+            try:
+                for name, version in jobs:
+                    try:
+                        data = await self.retrieve(name, version)
+                    except Exception as e:
+                        if onerror is not None:
+                            onerror(name, e)
+                        continue
+                    results.put_nowait((name, data))
+            finally:
+                results.put_nowait(finished)
+
+        workers = [asyncio.ensure_future(worker()) for i in range(concurrency)]
+        running = len(workers)
+        try:
+            while running:
+                item = await results.get()
+                if item is finished:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            for w in workers:
+                w.cancel()
+
+    async def find_many(self, names, versions=None, concurrency=64, onerror=None):
+        '''
+        Like :meth:`retrieve_many`, but yields ``(name, (version, filename, md5, url, ext))``
+        tuples, like :meth:`PyPIJson.find`.
+        '''
+
+        async for name, data in self.retrieve_many(names, versions, concurrency, onerror):
+            for release in _releases(data):
+                yield name, release
@@ -0,0 +1,263 @@
+'''
+A dependency graph built from the requirements of a collection of distributions.
+'''
+
+import heapq
+import collections
+
+from .utils import normalize_name
+
+
+class DependencyGraph(object):
+    '''
+    .. versionadded:: 0.8
+
+    Builds the dependency graph of *dists*, a :class:`pkgtools.pkg.WorkingSet` or any iterable
+    of :class:`pkgtools.pkg.Dist` objects, from their :attr:`~pkgtools.pkg.Dist.requirements`.
+    Distributions are identified by their normalized name (see :meth:`WorkingSet.by_name`), and
+    all the methods accept any spelling of a name::
+
+        >>> graph = DependencyGraph(WorkingSet(fast=True))
+        >>> graph.requires('pyg')
+        ['argh', 'pkgtools', 'setuptools']
+        >>> graph.required_by('pkgtools')
+        ['pyg']
+        >>> graph.closure('sphinx', extras=['test'])
+        ['docutils', 'jinja2', 'markupsafe', 'nose', 'pygments']
+
+    Closures are memoized, and when a distribution is added or removed only the closures
+    which contain it are discarded. Requirements which are not in the graph still appear in
+    closures (see :meth:`missing`). Sections of :file:`requires.txt` like ``[:sys_platform=="win32"]``
+    are treated as install requirements, since markers are not evaluated.
+
+    .. automethod:: add
+
+    .. automethod:: remove
+
+    .. automethod:: requires
+
+    .. automethod:: required_by
+
+    .. automethod:: closure
+
+    .. automethod:: missing
+
+    .. automethod:: topological_order
+
+    .. automethod:: cycles
+    '''
+
+    def __init__(self, dists=()):
+        self.dists = {}
+        ## Every node is mapped to {extra: set of (node, extras)}, None being the install requirements
+        self._edges = {}
+        self._reverse = collections.defaultdict(set)
+        self._closures = {}
+        if hasattr(dists, 'packages'):
+            dists = [item[1] for item in dists.packages.values()]
+        for dist in dists:
+            self.add(dist)
+
+    def __repr__(self):
+        return '<DependencyGraph[{0}] object at {1}>'.format(len(self.dists), id(self))
+
+    def __contains__(self, name):
+        return normalize_name(name) in self.dists
+
+    def __len__(self):
+        return len(self.dists)
+
+    def _invalidate(self, node):
+        for key in [k for k, closure in self._closures.items() if k[0] == node or node in closure]:
+            del self._closures[key]
+
+    def add(self, dist):
+        '''
+        Adds a distribution to the graph, replacing the one with the same name.
+        '''
+
+        node = normalize_name(dist.name)
+        if node in self.dists:
+            self.remove(node)
+        try:
+            requirements = dist.requirements
+        except KeyError:
+            requirements = {'install': (), 'extras': {}}
+        edges = collections.defaultdict(set)
+        for req in requirements['install']:
+            edges[None].add((normalize_name(req.name), req.extras))
+        for section, reqs in requirements['extras'].items():
+            ## Sections are 'extra', 'extra:marker' or ':marker'
+            extra = section.split(':')[0] or None
+            for req in reqs:
+                edges[extra].add((normalize_name(req.name), req.extras))
+        self.dists[node] = dist
+        self._edges[node] = dict(edges)
+        for dep, extras in edges.get(None, ()):
+            self._reverse[dep].add(node)
+        self._invalidate(node)
+
+    def remove(self, name):
+        '''
+        Removes a distribution from the graph. Raises :exc:`KeyError` if it is not in the graph.
+        '''
+
+        node = normalize_name(name)
+        del self.dists[node]
+        for dep, extras in self._edges.pop(node).get(None, ()):
+            self._reverse[dep].discard(node)
+        self._invalidate(node)
+
+    def _deps(self, node, extras=()):
+        edges = self._edges.get(node, {})
+        deps = set(edges.get(None, ()))
+        for extra in extras:
+            deps.update(edges.get(extra, ()))
+        return deps
+
+    def requires(self, name, extras=()):
+        '''
+        Returns the sorted names of the direct requirements of *name*, with the given *extras*.
+        '''
+
+        return sorted(set(dep for dep, e in self._deps(normalize_name(name), extras)))
+
+    def required_by(self, name, transitive=False):
+        '''
+        Returns the sorted names of the distributions which require *name* (without extras).
+        If *transitive* is True, the indirect dependents are included too.
+        '''
+
+        node = normalize_name(name)
+        if not transitive:
+            return sorted(self._reverse.get(node, ()))
+        seen = set()
+        stack = [node]
+        while stack:
+            for parent in self._reverse.get(stack.pop(), ()):
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        seen.discard(node)
+        return sorted(seen)
+
+    def _closure(self, node, extras):
+        key = (node, extras)
+        if key in self._closures:
+            return self._closures[key]
+        result = set()
+        seen = set([key])
+        stack = [key]
+        while stack:
+            current, current_extras = stack.pop()
+            for dep, dep_extras in self._deps(current, current_extras):
+                dep_key = (dep, frozenset(dep_extras))
+                if dep_key in seen:
+                    continue
+                seen.add(dep_key)
+                result.add(dep)
+                ## Memoized closures are complete, there's no need to walk them again
+                if dep_key in self._closures:
+                    result.update(self._closures[dep_key])
+                else:
+                    stack.append(dep_key)
+        result.discard(node)
+        closure = self._closures[key] = frozenset(result)
+        return closure
+
+    def closure(self, name, extras=()):
+        '''
+        Returns the sorted names of all the distributions required by *name* (with the given
+        *extras*), directly or indirectly. Extras of the requirements are followed too.
+        '''
+
+        return sorted(self._closure(normalize_name(name), frozenset(extras)))
+
+    def missing(self, name=None, extras=()):
+        '''
+        Returns the sorted names of the requirements which are not in the graph: all of them,
+        including the requirements of every extra, or only those in the closure of *name* with
+        the given *extras*.
+        '''
+
+        if name is not None:
+            required = self._closure(normalize_name(name), frozenset(extras))
+        else:
+            required = set(dep for edges in self._edges.values() for deps in edges.values() for dep, e in deps)
+        return sorted(n for n in required if n not in self.dists)
+
+    def topological_order(self):
+        '''
+        Returns the names of the distributions sorted so that every distribution comes after
+        its install requirements. Distributions in a cycle (see :meth:`cycles`) come last,
+        except for those which only require themselves: they are placed by their other
+        requirements.
+        '''
+
+        indegree = {}
+        for node in self.dists:
+            indegree[node] = len(set(dep for dep, e in self._deps(node) if dep in self.dists and dep != node))
+        ready = [node for node, n in indegree.items() if not n]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            node = heapq.heappop(ready)
+            order.append(node)
+            for parent in self._reverse.get(node, ()):
+                if parent in indegree and parent != node:
+                    indegree[parent] -= 1
+                    if not indegree[parent]:
+                        heapq.heappush(ready, parent)
+        done = set(order)
+        order.extend(sorted(node for node in self.dists if node not in done))
+        return order
+
+    def cycles(self):
+        '''
+        Returns the cycles of install requirements, as sorted lists of names.
+        '''
+
+        ## Tarjan's strongly connected components algorithm, without recursion
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        cycles = []
+        counter = [0]
+        for root in sorted(self.dists):
+            if root in index:
+                continue
+            work = [(root, None)]
+            while work:
+                node, deps = work.pop()
+                if deps is None:
+                    index[node] = lowlink[node] = counter[0]
+                    counter[0] += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                    deps = iter(sorted(set(d for d, e in self._deps(node) if d in self.dists)))
+                recurse = False
+                for dep in deps:
+                    if dep not in index:
+                        work.append((node, deps))
+                        work.append((dep, None))
+                        recurse = True
+                        break
+                    elif dep in on_stack:
+                        lowlink[node] = min(lowlink[node], index[dep])
+                if recurse:
+                    continue
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or any(d == node for d, e in self._deps(node)):
+                        cycles.append(sorted(component))
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+        return sorted(cycles)
@@ -0,0 +1,225 @@
+'''
+Timing hooks for the code paths of :mod:`pkgtools.pkg` and :mod:`pkgtools.pypi`. The library
+wraps its expensive operations in :func:`span` blocks; when no hook is registered a span
+costs a function call, otherwise every hook is called with the span's name, its duration
+in seconds and its tags.
+
+The spans are:
+
+    * ``pkg.archive.open``: opening an archive (tag ``path``)
+    * ``pkg.archive.read``: reading a member of an archive (tag ``member``)
+    * ``pkg.archive.walk``: walking the members of a tar archive, which decompresses it
+      (the members which are read are excluded)
+    * ``pkg.parse.<file>``: parsing a metadata file, e.g. ``pkg.parse.PKG-INFO``
+    * ``pkg.installed.glob``: looking for the metadata directory of an :class:`~pkgtools.pkg.Installed` package
+    * ``pypi.http``: an HTTP request (tags ``method`` and ``url``)
+    * ``pypi.xmlrpc.<method>``: an Xml-Rpc call, which includes its HTTP request
+
+A span which ends with an exception has the additional ``error`` tag. The spans around
+generators are paused while the consumer runs, so that they only time the reads and the
+parsing. An exception raised by a hook is turned into a :exc:`RuntimeWarning`, and the
+other hooks are still called.
+'''
+
+import time
+import warnings
+import threading
+import collections
+
+
+try:
+    _clock = time.perf_counter
+except AttributeError:
+    _clock = time.time
+
+## Copied on write, so that spans can iterate over it without a lock
+_hooks = ()
+
+
+def add_hook(hook):
+    '''
+    .. versionadded:: 0.8
+
+    Registers *hook*, a callable which receives ``(name, duration, tags)`` at the end of
+    every span.
+    '''
+
+    global _hooks
+    if hook not in _hooks:
+        _hooks = _hooks + (hook,)
+
+
+def remove_hook(hook):
+    '''
+    .. versionadded:: 0.8
+
+    Unregisters *hook*. Does nothing if it was not registered.
+    '''
+
+    global _hooks
+    _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def enabled():
+    '''
+    .. versionadded:: 0.8
+
+    Returns True if at least one hook is registered.
+    '''
+
+    return bool(_hooks)
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('name', 'tags', 'start', 'elapsed')
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = self.elapsed + _clock() - self.start
+        if exc_type is not None:
+            self.tags['error'] = exc_type.__name__
+        for hook in _hooks:
+            ## A failing hook must not replace the exception raised in the block
+            try:
+                hook(self.name, duration, self.tags)
+            except Exception as e:
+                warnings.warn('Hook {0!r} failed on span {1!r}: {2!r}'.format(hook, self.name, e),
+                              RuntimeWarning)
+        return False
+
+    def pause(self):
+        self.elapsed += _clock() - self.start
+
+    def resume(self):
+        self.start = _clock()
+
+
+def span(name, **tags):
+    '''
+    .. versionadded:: 0.8
+
+    Returns a context manager which times its block and passes the result to the registered
+    hooks::
+
+        >>> with span('myapp.load', path=path):
+        ...     Egg(path)
+
+    The returned object has the ``pause()`` and ``resume()`` methods, which exclude a part
+    of the block (e.g. a ``yield``) from the duration.
+    '''
+
+    if not _hooks:
+        return _NULL_SPAN
+    return _Span(name, tags)
+
+
+def _percentile(values, p):
+    ## Nearest-rank percentile of sorted *values*
+    return values[max(0, int(-(-len(values) * p // 100)) - 1)]
+
+
+class Aggregator(object):
+    '''
+    .. versionadded:: 0.8
+
+    A hook which collects the duration of the spans and reports, for each span name, the
+    number of spans, their total duration and the 50th and 99th percentiles. It can be used
+    as a context manager, which registers it for the duration of the block::
+
+        >>> with Aggregator() as agg:
+        ...     ws = WorkingSet(fast=True)
+        ...     dists = [get_metadata(p) for p in glob.glob('dist/*')]
+        >>> print(agg.report())
+        span                              count      total        p50        p99
+        pkg.archive.open                     12    3.121ms    0.198ms    0.512ms
+        pkg.parse.PKG-INFO                   48    5.902ms    0.101ms    0.402ms
+        ...
+
+    *key* is an optional function which receives the span's name and tags and returns the
+    key under which the span is aggregated (by default, its name).
+
+    .. automethod:: stats
+
+    .. automethod:: report
+
+    .. automethod:: reset
+    '''
+
+    def __init__(self, key=None):
+        self.key = key
+        self._durations = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Aggregator[{0}] object at {1}>'.format(len(self._durations), id(self))
+
+    def __call__(self, name, duration, tags):
+        key = name if self.key is None else self.key(name, tags)
+        with self._lock:
+            self._durations[key].append(duration)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *args):
+        remove_hook(self)
+
+    def stats(self):
+        '''
+        Returns a dictionary which maps every key to a dictionary with the ``count``,
+        ``total``, ``p50`` and ``p99`` keys (durations are in seconds).
+        '''
+
+        with self._lock:
+            durations = dict((k, sorted(v)) for k, v in self._durations.items())
+        return dict((k, {'count': len(v), 'total': sum(v), 'p50': _percentile(v, 50),
+                         'p99': _percentile(v, 99)}) for k, v in durations.items())
+
+    def report(self):
+        '''
+        Returns the statistics as a table, sorted by total duration.
+        '''
+
+        stats = self.stats()
+        width = max([len(str(k)) for k in stats] + [4])
+        lines = ['{0:<{w}} {1:>8} {2:>10} {3:>10} {4:>10}'.format('span', 'count', 'total', 'p50', 'p99', w=width)]
+        for key, s in sorted(stats.items(), key=lambda item: -item[1]['total']):
+            lines.append('{0:<{w}} {1:>8} {2:>8.3f}ms {3:>8.3f}ms {4:>8.3f}ms'.format(
+                key, s['count'], s['total'] * 1e3, s['p50'] * 1e3, s['p99'] * 1e3, w=width))
+        return '\n'.join(lines)
+
+    def reset(self):
+        '''
+        Discards the collected durations.
+        '''
+
+        with self._lock:
+            self._durations.clear()
@@ -0,0 +1,260 @@
+'''
+Keeps a local copy of the metadata of a PyPI-compatible index up to date, fetching only the
+releases which changed since the last synchronization.
+'''
+
+import time
+import sqlite3
+import threading
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from .pypi import PyPIXmlRpc, PyPIJson
+
+
+class MirrorStore(object):
+    '''
+    The local store of a mirror: an SQLite database at *path* which holds the Json data of
+    every release, the changelog serial of the last synchronization and the releases whose
+    retrieval failed (they are retried by the next synchronization)::
+
+        >>> store = MirrorStore('mirror.db')
+        >>> store.get('pyg', '0.4')['info']['author']
+        'Michele Lacchia'
+        >>> store.versions('pyg')
+        ['0.4', '0.3.2']
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS releases (name TEXT, version TEXT, '
+                             'data TEXT, updated REAL, PRIMARY KEY (name, version))')
+            self._db.execute('CREATE TABLE IF NOT EXISTS pending (name TEXT, version TEXT, '
+                             'PRIMARY KEY (name, version))')
+            self._db.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)')
+
+    def __repr__(self):
+        return '<MirrorStore[{0}] object at {1}>'.format(self.path, id(self))
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM releases')[0][0]
+
+    def __iter__(self):
+        for name, version, data in self._query('SELECT name, version, data FROM releases'):
+            yield name, version, json.loads(data)
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def _execute(self, statements):
+        with self._lock:
+            with self._db:
+                for sql, args in statements:
+                    self._db.execute(sql, args)
+
+    def get(self, name, version):
+        '''
+        Returns the data of the given release, or None.
+        '''
+
+        rows = self._query('SELECT data FROM releases WHERE name = ? AND version = ?', (name, version))
+        return json.loads(rows[0][0]) if rows else None
+
+    def versions(self, name):
+        '''
+        Returns the versions of *name* which are in the store.
+        '''
+
+        return [r[0] for r in self._query('SELECT version FROM releases WHERE name = ?', (name,))]
+
+    def put(self, name, version, data):
+        self._execute([
+            ('INSERT OR REPLACE INTO releases VALUES (?, ?, ?, ?)', (name, version, json.dumps(data), time.time())),
+            ('DELETE FROM pending WHERE name = ? AND version = ?', (name, version)),
+        ])
+
+    def remove(self, name, version=None):
+        '''
+        Removes a release, or all the releases of *name* if *version* is None.
+        '''
+
+        if version is None:
+            self._execute([('DELETE FROM releases WHERE name = ?', (name,)),
+                           ('DELETE FROM pending WHERE name = ?', (name,))])
+        else:
+            self._execute([('DELETE FROM releases WHERE name = ? AND version = ?', (name, version)),
+                           ('DELETE FROM pending WHERE name = ? AND version = ?', (name, version))])
+
+    @property
+    def pending(self):
+        return [tuple(r) for r in self._query('SELECT name, version FROM pending')]
+
+    def add_pending(self, name, version):
+        self._execute([('INSERT OR REPLACE INTO pending VALUES (?, ?)', (name, version))])
+
+    @property
+    def since(self):
+        '''
+        The timestamp of the last change seen by a synchronization, or None.
+        '''
+
+        rows = self._query("SELECT value FROM state WHERE key = 'since'")
+        return rows[0][0] if rows else None
+
+    @since.setter
+    def since(self, value):
+        self._execute([("INSERT OR REPLACE INTO state VALUES ('since', ?)", (value,))])
+
+    @property
+    def serial(self):
+        '''
+        The changelog serial of the last event seen by a synchronization, or None.
+        '''
+
+        rows = self._query("SELECT value FROM state WHERE key = 'serial'")
+        return rows[0][0] if rows else None
+
+    @serial.setter
+    def serial(self, value):
+        self._execute([("INSERT OR REPLACE INTO state VALUES ('serial', ?)", (value,))])
+
+
+class MirrorSync(object):
+    '''
+    Synchronizes a :class:`MirrorStore` with an index. Every call to :meth:`sync` asks the index
+    for the changes since the last synchronization (:meth:`PyPIXmlRpc.changelog_since_serial`),
+    deduplicates the affected ``(name, version)`` pairs and retrieves only those releases through
+    the Json API, so that its cost depends on the number of changes and not on the size of the index::
+
+        >>> sync = MirrorSync(MirrorStore('mirror.db'))
+        >>> sync.sync(time.time() - 3600)
+        {'updated': [('pyg', '0.4'), ...], 'removed': [...], 'failed': [], 'serial': 1312460050}
+        >>> sync.sync() # Starts from the last change seen
+        {'updated': [], 'removed': [], 'failed': [], 'serial': 1312460050}
+
+    The position in the changelog is kept as a serial, since timestamps have a resolution of
+    one second: the events logged later in the same second as the last one seen would be lost.
+
+    *xmlrpc* is the :class:`PyPIXmlRpc` object used to read the changelog and *json_url*
+    the Json API URL template (by default :attr:`PyPIJson.URL`), so that any PyPI-compatible
+    index can be mirrored. *client* is an optional :class:`pkgtools.pypi.HTTPClient` used for
+    the Json requests, which are sent by *workers* threads.
+
+    .. automethod:: changes
+
+    .. automethod:: sync
+    '''
+
+    ## The changelog actions which remove a release (or, without version, a whole package)
+    REMOVALS = ('remove', 'remove project', 'remove release')
+
+    def __init__(self, store, xmlrpc=None, json_url=None, client=None, workers=8):
+        self.store = store
+        self.xmlrpc = xmlrpc or PyPIXmlRpc(client=client)
+        self.json_url = json_url or PyPIJson.URL
+        self.client = client
+        self.workers = workers
+
+    def __repr__(self):
+        return '<MirrorSync[{0}] object at {1}>'.format(self.store.path, id(self))
+
+    def changes(self, since=0, serial=None):
+        '''
+        Returns a ``(changes, last)`` tuple: *changes* maps every ``(name, version)`` pair
+        changed after the timestamp *since* to its last action, and *last* is the timestamp of
+        the last change. If *serial* is given, the changes after the event with that serial are
+        returned instead, and *last* is the serial of the last change.
+        Changes which do not concern a release are ignored, except for removals.
+        '''
+
+        if serial is not None:
+            events = ((e[0], e[1], e[4], e[3]) for e in self.xmlrpc.iter_changelog_since_serial(serial))
+            last = serial
+        else:
+            events = self.xmlrpc.iter_changelog(since)
+            last = since
+        changes = {}
+        for name, version, position, action in events:
+            last = max(last, position)
+            removal = action in self.REMOVALS
+            if version is None:
+                if not removal:
+                    continue
+                ## The earlier changes of a removed package don't matter anymore
+                for key in [k for k in changes if k[0] == name]:
+                    del changes[key]
+            changes[name, version] = 'remove' if removal else action
+        return changes, last
+
+    def _fetch(self, release):
+        name, version = release
+        pypi = PyPIJson(name, fast=True, client=self.client)
+        pypi.URL = self.json_url
+        return pypi.retrieve(version)
+
+    def sync(self, since=None, onerror=None):
+        '''
+        Applies the changes which happened after the timestamp *since* (by default, after the
+        last change seen by the previous synchronization) and retries the releases which failed
+        last time. Returns a dictionary with the updated, removed and failed ``(name, version)``
+        pairs and the changelog serial the next synchronization starts from.
+        Releases which are not on the index anymore (the Json API answers 404) are removed
+        from the store; *onerror* is called with the release and the exception when a release
+        cannot be retrieved for any other reason.
+        '''
+
+        serial = self.store.serial
+        if since is None and serial is not None:
+            changes, serial = self.changes(serial=serial)
+        else:
+            ## The serial is read first: the changes logged while the changelog is read are
+            ## seen again by the next synchronization, and releases are simply fetched twice
+            serial = self.xmlrpc.changelog_last_serial()
+            if since is None:
+                since = self.store.since or 0
+            changes, last = self.changes(since)
+            self.store.since = last
+        ## A removal without version removes the whole package
+        removed = sorted((r for r, action in changes.items() if action == 'remove'),
+                         key=lambda r: (r[0], r[1] or ''))
+        for name, version in removed:
+            self.store.remove(name, version)
+        fetch = set(r for r, action in changes.items() if action != 'remove')
+        fetch.update(self.store.pending)
+
+        updated, failed = [], []
+        for release, data, exc in self._fetch_all(sorted(fetch)):
+            if exc is None:
+                self.store.put(release[0], release[1], data)
+                updated.append(release)
+            elif getattr(exc, 'code', None) == 404:
+                ## Retrying would not help: the release was removed or hidden
+                self.store.remove(*release)
+                removed.append(release)
+            else:
+                self.store.add_pending(*release)
+                failed.append(release)
+                if onerror is not None:
+                    onerror(release, exc)
+        self.store.serial = serial
+        removed.sort(key=lambda r: (r[0], r[1] or ''))
+        return {'updated': sorted(updated), 'removed': removed, 'failed': sorted(failed), 'serial': serial}
+
+    def _fetch_all(self, releases):
+        def fetch(release):
+            try:
+                return release, self._fetch(release), None
+            except Exception as e:
+                return release, None, e
+        if self.workers <= 1 or len(releases) <= 1:
+            return [fetch(r) for r in releases]
+        from concurrent import futures
+        with futures.ThreadPoolExecutor(self.workers) as pool:
+            return list(pool.map(fetch, releases))
@@ -1,25 +1,151 @@
 import os
+import re
+import csv
+import codecs
 import sys
 import glob
+import time
+import struct
+import marshal
+import sqlite3
 import pkgutil
 import tarfile
 import zipfile
 import warnings
+import threading
 import collections
 
 if sys.version_info >= (3,):
     import io as StringIO
     import configparser as ConfigParser
+    import pickle
+    from sys import intern
 else:
     import StringIO
     import ConfigParser
+    import cPickle as pickle
 
 from email.parser import FeedParser
-from .utils import ext, tar_files, zip_files
+from .utils import cache_dir, ext, normalize_name, open_zip, scandir, tar_files, zip_files
+from .version import parse_version
+from .instrument import span
+
+
+class Requirement(object):
+    '''
+    .. versionadded:: 0.8
+
+    A parsed requirement string, like ``'foo[bar,baz] >=1.0, <2; python_version < "3"'``, with the
+    :attr:`name`, :attr:`specifier` (``'>=1.0,<2'``), :attr:`extras` (``('bar', 'baz')``) and
+    :attr:`markers` (``'python_version < "3"'``) attributes. The :attr:`url` attribute holds
+    the URL of a :pep:`508` direct reference, like ``'foo @ https://example.com/foo.zip'``
+    (such requirements have no specifier).
+    Use :meth:`parse` to build them: requirements are interned by their normalized form
+    (:attr:`string`, which is also their :func:`str`), so equal requirements are always the
+    same object, which is shared by all the distributions::
+
+        >>> r = Requirement.parse('argh>=0.14')
+        >>> r.name, r.specifier
+        ('argh', '>=0.14')
+        >>> r is Requirement.parse('argh >= 0.14')
+        True
+    '''
+
+    __slots__ = ('name', 'specifier', 'markers', 'extras', 'url', 'string')
+
+    ## After the name and the extras come either a direct reference ('@ url', where the URL
+    ## ends at the first whitespace) or a specifier, then the markers
+    _REGEX = re.compile(r'^\s*([^\s\[\]();<>=!~@]+)\s*(?:\[([^\]]*)\])?\s*'
+                        r'(?:@\s*(\S+)\s*|\(?([\s\w<>=!~,.*+-]*)\)?\s*)(?:;\s*(.*))?$')
+    ## Both the normalized strings and the parsed ones map to the interned requirements
+    _interned = {}
+    _interned_sets = {}
+    _string_sets = {}
+
+    def __init__(self, name, specifier='', markers='', extras=(), url=''):
+        self.name = intern(name)
+        self.specifier = intern(specifier)
+        self.markers = intern(markers)
+        self.extras = tuple(sorted(intern(e) for e in extras))
+        self.url = intern(url)
+        self.string = intern(str(self._format()))
+
+    def _format(self):
+        s = self.name
+        if self.extras:
+            s += '[{0}]'.format(','.join(self.extras))
+        if self.url:
+            ## The space before the semicolon keeps it out of the URL
+            s += ' @ ' + self.url + (' ' if self.markers else '')
+        s += self.specifier
+        if self.markers:
+            s += '; ' + self.markers
+        return s
+
+    def __repr__(self):
+        return '<Requirement[{0}] object at {1}>'.format(self.string, id(self))
+
+    def __str__(self):
+        return self.string
+
+    def __eq__(self, other):
+        return isinstance(other, Requirement) and self.string == other.string
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.string)
+
+    @classmethod
+    def parse(cls, string):
+        '''
+        Parses *string* and returns the interned :class:`Requirement`. Raises :exc:`ValueError`
+        if the string is not a valid requirement.
+        '''
+
+        try:
+            return cls._interned[string]
+        except KeyError:
+            pass
+        m = cls._REGEX.match(string)
+        if m is None:
+            raise ValueError('Invalid requirement: {0}'.format(string))
+        name, extras, url, specifier, markers = m.groups()
+        extras = [e.strip() for e in (extras or '').split(',') if e.strip()]
+        specifier = ''.join((specifier or '').split())
+        req = cls(name, specifier, (markers or '').strip(), extras, url or '')
+        req = cls._interned.setdefault(req.string, req)
+        ## So that the same string is not parsed again
+        return cls._interned.setdefault(string, req)
+
+    @classmethod
+    def parse_set(cls, strings):
+        '''
+        Returns the interned frozenset of the requirements parsed from *strings*.
+        '''
+
+        key = frozenset(strings)
+        try:
+            return cls._interned_sets[key]
+        except KeyError:
+            reqs = frozenset(cls.parse(s) for s in key)
+            return cls._interned_sets.setdefault(key, reqs)
+
+    @classmethod
+    def _intern_strings(cls, strings):
+        ## The interned frozenset of the requirement strings *strings*
+        key = frozenset(intern(s) for s in strings)
+        return cls._string_sets.setdefault(key, key)
 
 
 class MetadataFileParser(object):
 
+    ## The METADATA fields which can appear more than once
+    MULTIPLE_USE = set(['Platform', 'Supported-Platform', 'Classifier', 'Requires-Dist', 'Provides-Dist',
+                        'Obsoletes-Dist', 'Requires-External', 'Project-URL', 'Provides-Extra',
+                        'Dynamic', 'License-File'])
+
     def __init__(self, data, name):
 
         self.MAP = {
@@ -30,17 +156,29 @@ class MetadataFileParser(object):
             'dependency_links.txt': self.list,
             'installed-files.txt': self.list,
             'entry_points.txt': self.config,
+            'METADATA': self.core_metadata,
+            'WHEEL': self.pkg_info,
+            'RECORD': self.record,
         }
+        if not isinstance(data, str):
+            ## Archives hand us raw bytes (or slices of a memory-mapped archive, for which
+            ## decoding is the only copy): decode them only when parsing
+            try:
+                data = codecs.decode(data, 'utf-8')
+            except UnicodeDecodeError:
+                ## The PKG-INFO files of old eggs and sdists are often latin-1
+                data = codecs.decode(data, 'latin-1')
         self.data = data
         self.name = name
         if not self.name:
             raise TypeError('Invalid file name: {0}'.format(self.name))
 
     def parse(self):
-        try:
-            return self.MAP[self.name]()
-        except (KeyError, ConfigParser.MissingSectionHeaderError):
-            return {}
+        with span('pkg.parse.' + self.name):
+            try:
+                return self.MAP[self.name]()
+            except (KeyError, ConfigParser.MissingSectionHeaderError):
+                return {}
 
     def pkg_info(self):
         d = {}
@@ -49,6 +187,55 @@ class MetadataFileParser(object):
         d.update(list(f.close().items()))
         return d
 
+    def core_metadata(self):
+        ## Like pkg_info, but the fields which can be repeated are always lists
+        f = FeedParser()
+        f.feed(self.data)
+        message = f.close()
+        d = {}
+        for key in message.keys():
+            if key in self.MULTIPLE_USE:
+                d[key] = message.get_all(key)
+            else:
+                d[key] = message[key]
+        ## Since Metadata-Version 2.1 the description can be the message body
+        body = message.get_payload()
+        if 'Description' not in d and body and body.strip():
+            d['Description'] = body
+        return d
+
+    def record(self):
+        return [tuple(row) for row in csv.reader(self.data.splitlines()) if row]
+
+    def headers(self, keys=None):
+        '''
+        Scan the headers of a PKG-INFO file, stopping at the first blank line (where the
+        description body starts). If *keys* is given, stop as soon as all of them have been found.
+        '''
+
+        d = {}
+        wanted = set(keys) if keys is not None else None
+        key = None
+        for line in self.data.splitlines():
+            if not line.strip():
+                break
+            if line[0] in ' \t':
+                ## A continuation line
+                if key is not None:
+                    d[key] += '\n' + line
+                continue
+            if wanted is not None and key in wanted and key in d:
+                ## The previous header is complete
+                wanted.discard(key)
+                if not wanted:
+                    break
+            key, sep, value = line.partition(':')
+            if not sep:
+                key = None
+                continue
+            d[key] = value.strip()
+        return d
+
     def list(self, add_sections=False):
         d = []
         for line in self.data.splitlines():
@@ -77,8 +264,7 @@ class MetadataFileParser(object):
                 reqs['extras'][cursect].add(r)
             else:
                 reqs['install'].add(r)
-        reqs['extras'] = dict(reqs['extras'])
-        return reqs
+        return _intern_requires(reqs)
 
     def config(self):
         d = {}
@@ -89,13 +275,153 @@ class MetadataFileParser(object):
         return d
 
 
+class MetadataCache(object):
+    '''
+    .. versionadded:: 0.8
+
+    A persistent cache for the metadata of archives (:class:`Egg` and :class:`SDist` objects).
+    Entries are stored in an SQLite database inside *directory* (by default the
+    ``PKGTOOLS_CACHE_DIR`` environment variable or :file:`~/.cache/pkgtools`) and are keyed
+    by the archive's absolute path: an entry is used only if the archive's size and
+    modification time did not change since it was stored. The Dist classes use it on a
+    best-effort basis: when the database cannot be read or written, the archive is read.
+    When the cached data exceeds *max_size* bytes the oldest entries are evicted::
+
+        >>> cache = MetadataCache()
+        >>> e = Egg('pyg-0.4-py2.7.egg', cache=cache) # Reads the archive
+        >>> e = Egg('pyg-0.4-py2.7.egg', cache=cache) # A single lookup
+        >>> cache.invalidate('pyg-0.4-py2.7.egg')
+
+    .. automethod:: get
+
+    .. automethod:: set
+
+    .. automethod:: invalidate
+    '''
+
+    def __init__(self, directory=None, max_size=64 * 1024 * 1024):
+        self.directory = cache_dir(directory)
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        ## The database is opened on first use and the size of the stored data is computed
+        ## by the first set(), then kept up to date: creating a cache (e.g. in every worker
+        ## process of load_many) costs nothing
+        self._db = None
+        self._size = None
+
+    def __repr__(self):
+        return '<MetadataCache[{0}] object at {1}>'.format(self.directory, id(self))
+
+    ## The cache can be sent to worker processes (see load_many): they open their own connection
+    def __getstate__(self):
+        return {'directory': self.directory, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connect(self):
+        ## Called with the lock held
+        if self._db is None:
+            db = sqlite3.connect(os.path.join(self.directory, 'metadata.db'), check_same_thread=False)
+            with db:
+                db.execute('CREATE TABLE IF NOT EXISTS metadata (path TEXT, members TEXT, '
+                           'size INTEGER, mtime REAL, stored REAL, data BLOB, '
+                           'PRIMARY KEY (path, members))')
+            self._db = db
+        return self._db
+
+    def _key(self, path, members):
+        ## Entries built from a subset of the files must not be mixed with complete ones
+        return os.path.abspath(path), ','.join(sorted(members)) if members is not None else '*'
+
+    def get(self, path, members=None, st=None):
+        '''
+        Returns the cached state for the archive at *path*, or None if there is no
+        valid entry for it. *st* is the archive's :func:`os.stat` result, if it is already known.
+        '''
+
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+        with self._lock:
+            row = self._connect().execute('SELECT size, mtime, data FROM metadata WHERE path = ? AND members = ?',
+                                   self._key(path, members)).fetchone()
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime):
+            return None
+        return pickle.loads(bytes(row[2]))
+
+    def set(self, path, members, state, st=None):
+        '''
+        Stores *state* for the archive at *path* and evicts the oldest entries if the cache grew
+        beyond its maximum size. *st* should be the archive's :func:`os.stat` result taken
+        before it was read: by default the archive is stat'ed now.
+        '''
+
+        if st is None:
+            st = os.stat(path)
+        data = sqlite3.Binary(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+        key = self._key(path, members)
+        with self._lock:
+            db = self._connect()
+            with db:
+                old = db.execute('SELECT LENGTH(data) FROM metadata WHERE path = ? AND members = ?',
+                                 key).fetchone()
+                db.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)',
+                           key + (st.st_size, st.st_mtime, time.time(), data))
+                if self._size is None:
+                    self._size = self._total()
+                else:
+                    self._size += len(data) - (old[0] if old is not None else 0)
+                if self._size > self.max_size:
+                    self._evict()
+
+    def _total(self):
+        return self._db.execute('SELECT SUM(LENGTH(data)) FROM metadata').fetchone()[0] or 0
+
+    def _evict(self):
+        ## Other processes may share the database, so the running total is checked first
+        self._size = self._total()
+        if self._size <= self.max_size:
+            return
+        rows = self._db.execute('SELECT rowid, LENGTH(data) FROM metadata ORDER BY stored').fetchall()
+        for rowid, size in rows:
+            if self._size <= self.max_size:
+                break
+            self._db.execute('DELETE FROM metadata WHERE rowid = ?', (rowid,))
+            self._size -= size
+
+    def invalidate(self, path=None):
+        '''
+        Removes the entries for the archive at *path*. If *path* is None, the whole cache is cleared.
+        '''
+
+        with self._lock:
+            db = self._connect()
+            with db:
+                if path is None:
+                    db.execute('DELETE FROM metadata')
+                else:
+                    db.execute('DELETE FROM metadata WHERE path = ?', (os.path.abspath(path),))
+                self._size = None
+
+
+def _bytes(data):
+    return data.tobytes() if isinstance(data, memoryview) else data
+
+
 class Dist(object):
     '''
-    This is the base class for all other objects. It requires a list of tuples (``(file_data, file_name)``) and provides some attributes/methods:
+    This is the base class for all other objects. It requires a list of tuples (``(file_data, file_name)``) and provides some attributes/methods.
+
+    .. versionadded:: 0.8
+        The *lazy* argument. When it is True, files are not parsed by the constructor: their raw data is kept and each file is parsed (and cached) the first time it is requested, either with :meth:`file` or through one of the attributes below.
 
     .. attribute:: name
 
-        The package's name.
+        The package's name. In lazy mode, this and :attr:`version` only scan the headers of
+        :file:`PKG-INFO`, which is fully parsed only when other keys are requested.
 
     .. attribute:: version
 
@@ -111,6 +437,17 @@ class Dist(object):
 
         This distribution's requirements (including extras).
 
+        .. versionchanged:: 0.8
+            The requirement strings are grouped in frozensets, which are interned and
+            shared by all the distributions.
+
+    .. attribute:: requirements
+
+        .. versionadded:: 0.8
+
+        Like :attr:`requires`, but the requirements are :class:`Requirement` objects, grouped
+        in frozensets. Both are interned, so they are shared by all the distributions.
+
     .. attribute:: location
 
         .. versionadded: 0.7
@@ -119,7 +456,8 @@ class Dist(object):
 
     .. attribute:: files
 
-        All the files parsed by this distribution.
+        All the files parsed by this distribution. In lazy mode this also lists the files
+        which have not been parsed yet.
 
     .. attribute:: has_metadata
 
@@ -142,39 +480,106 @@ class Dist(object):
     _arg_name = None
     _zip_safe = True
     _name = _version = None
+    _headers = None
+    ## The files left out of a WorkingSet snapshot, which are read again when requested
+    _deferred = ()
+    ## The file which holds the core metadata
+    _pkg_info_name = 'PKG-INFO'
 
-    def __init__(self, file_objects):
+    def __init__(self, file_objects, lazy=False):
         self.metadata = {}
         self.file_objects = file_objects
-        self._get_metadata()
+        self._pending = {}
+        self._get_metadata(lazy)
 
     def __repr__(self):
         ## A little trick to get the real name from sub-classes (like Egg or SDist)
         return '<{0}[{1}] object at {2}>'.format(self.__class__.__name__, self._arg_name, id(self))
 
-    def _get_metadata(self):
+    def _get_metadata(self, lazy=False):
         for data, name in self.file_objects:
             if name == 'not-zip-safe':
                 self._zip_safe = False
-            elif name.endswith('.txt') or name == 'PKG-INFO':
-                metadata = MetadataFileParser(data, name).parse()
-                #if not metadata:
-                #    continue
-                self.metadata[name] = metadata
+            elif name.endswith('.txt') or name in (self._pkg_info_name, 'RECORD', 'WHEEL'):
+                ## Keep the raw data, it will be parsed by Dist.file
+                self._pending[name] = data
+                if not lazy:
+                    self.file(name)
         return self.metadata
 
+    def _dump(self):
+        ## A picklable snapshot of this distribution: the files which have not been
+        ## parsed yet are stored raw, so that lazy mode stays lazy
+        return {'metadata': self.metadata, 'pending': dict(self._pending), 'zip_safe': self._zip_safe}
+
+    def _restore(self, state, lazy=False):
+        self.file_objects = []
+        self.metadata = state['metadata']
+        self._pending = state.get('pending', {})
+        self._zip_safe = state['zip_safe']
+        if not lazy:
+            for name in list(self._pending):
+                self.file(name)
+
+    def _close_archive(self, archive):
+        ## The files are parsed while the archive is open. The raw data is then released,
+        ## except for the files which are still pending: those slices of a memory-mapped
+        ## archive are copied, since the mapping cannot be closed while they are alive
+        self.file_objects = []
+        self._pending = dict((name, _bytes(data)) for name, data in getattr(self, '_pending', {}).items())
+        archive.close()
+
+    def _from_cache(self, cache, members, lazy=False):
+        if cache is None:
+            return False
+        ## The archive is stat'ed before it is read: if it is replaced in the meantime,
+        ## the entry is stored with the old stat and it will not be used
+        try:
+            st = os.stat(self.location)
+        except OSError:
+            return False
+        ## The cache is best-effort: a locked database or a corrupt entry must not
+        ## prevent the archive from being read
+        try:
+            state = cache.get(self.location, members, st)
+            if state is not None:
+                self._restore(state, lazy)
+                return True
+        except Exception:
+            pass
+        self._stat = st
+        return False
+
+    def _to_cache(self, cache, members):
+        st = self.__dict__.pop('_stat', None)
+        if cache is not None and st is not None:
+            try:
+                cache.set(self.location, members, self._dump(), st)
+            except (sqlite3.Error, pickle.PicklingError, EnvironmentError):
+                pass
+
     @property
     def has_metadata(self):
-        return bool(self.metadata)
+        return bool(self.metadata or self._pending or self._deferred)
 
     @property
     def pkg_info(self):
-        return self.file('PKG-INFO')
+        return self.file(self._pkg_info_name)
+
+    def _header(self, key):
+        ## Name and Version do not require the whole PKG-INFO to be parsed
+        if self._headers is None:
+            data = self._pending.get(self._pkg_info_name)
+            if data is None:
+                return self.pkg_info[key]
+            parser = MetadataFileParser(data, self._pkg_info_name)
+            self._headers = parser.headers(('Name', 'Version'))
+        return self._headers[key]
 
     @property
     def name(self):
         try:
-            return self.pkg_info['Name']
+            return self._header('Name')
         except KeyError:
             if self._name is None:
                 raise
@@ -183,37 +588,70 @@ class Dist(object):
     @property
     def version(self):
         try:
-            return self.pkg_info['Version']
+            return self._header('Version')
         except KeyError:
             if self._version is None:
                 raise
             return self._version
 
+    @property
+    def version_key(self):
+        ## The sort key of the version, see pkgtools.version.parse_version
+        return parse_version(self.version)
+
     @property
     def as_req(self):
         return '{0}=={1}'.format(self.name, self.version)
 
     @property
     def requires(self):
+        if self._pkg_info_name == 'METADATA' and 'requires.txt' not in self.files:
+            return _requires_dist(self.pkg_info.get('Requires-Dist', ()))
         return self.file('requires.txt')
 
+    @property
+    def requirements(self):
+        ## Built from requires every time: both are made of interned sets, so
+        ## it costs a few lookups and nothing is stored twice
+        reqs = self.requires
+        return {
+            'install': Requirement.parse_set(reqs['install']),
+            'extras': dict((e, Requirement.parse_set(r)) for e, r in reqs['extras'].items()),
+        }
+
     @property
     def zip_safe(self):
         return self._zip_safe
 
     @property
     def files(self):
-        return list(self.metadata.keys())
+        names = list(self.metadata.keys())
+        for name in list(self._pending.keys()) + list(self._deferred):
+            if name not in names:
+                names.append(name)
+        return names
 
     def file(self, name):
         '''
         Returns the content of the specified file. Raises :exc:`KeyError` when the distribution does not have such file.
         '''
 
+        data = self._pending.get(name)
+        if data is None and name in self._deferred and name not in self.metadata:
+            data = self._read_file(name)
+        if data is not None:
+            ## The file leaves _pending only once it is in metadata, so that other
+            ## threads reading the same Dist always find it in one of them
+            self.metadata.setdefault(name, MetadataFileParser(data, name).parse())
+            self._pending.pop(name, None)
         if name not in self.metadata:
             raise KeyError('This package does not have {0} file'.format(name))
         return self.metadata[name]
 
+    def _read_file(self, name):
+        ## The raw data of the file *name*, read again from the distribution, or None
+        return None
+
     def entry_points_map(self, group):
         '''
         Returns the elements under the specified section in the :file:`entry_points.txt` file.
@@ -225,6 +663,48 @@ class Dist(object):
             return {}
 
 
+_EXTRA = r'''extra\s*==\s*['"]([^'"]+)['"]'''
+## A clause like 'extra == "a"' or '(extra == "a" or extra == "b")', joined to the other markers by 'and'
+_EXTRA_MARKER = re.compile(r'(?:^|\s+and\s+)\(?\s*{0}(?:\s+or\s+{0})*\s*\)?(?:\s+and\s+|$)'.format(
+    _EXTRA.replace('(', '(?:', 1)))
+
+
+def _intern_requires(reqs):
+    ## The same requirements appear in many distributions: the sets of strings are
+    ## replaced by interned frozensets, which are shared by all of them
+    return {
+        'install': Requirement._intern_strings(reqs['install']),
+        'extras': dict((intern(e), Requirement._intern_strings(r)) for e, r in reqs['extras'].items()),
+    }
+
+
+def _requires_dist(requires_dist):
+    ## Converts the Requires-Dist fields of METADATA to the requires.txt format:
+    ## 'foo (>=1.0); extra == "test"' becomes 'foo>=1.0' in the 'test' section
+    reqs = {
+        'install': set(),
+        'extras': collections.defaultdict(set)
+    }
+    for field in requires_dist:
+        req, _, markers = field.partition(';')
+        req = intern(re.sub(r'\s*\(\s*([^)]*?)\s*\)', r'\1', req.strip()))
+        markers = markers.strip()
+        extras = ['']
+        match = _EXTRA_MARKER.search(markers)
+        if match is not None:
+            ## 'extra == "a" or extra == "b"' puts the requirement in both sections
+            extras = re.findall(_EXTRA, match.group(0))
+            rest = [m.strip() for m in (markers[:match.start()], markers[match.end():]) if m.strip()]
+            markers = ' and '.join(rest)
+        for extra in extras:
+            if not extra and not markers:
+                reqs['install'].add(req)
+            else:
+                section = extra + (':' + markers if markers else '')
+                reqs['extras'][section].add(req)
+    return _intern_requires(reqs)
+
+
 class Egg(Dist):
     '''
     Given the egg path, returns a Dist object::
@@ -248,12 +728,45 @@ class Egg(Dist):
         {'pyg': 'pyg:main'}
         >>> e.file('entry_points.txt')
         {'console_scripts': {'pyg': 'pyg:main'}}
+
+    .. versionadded:: 0.8
+        If *members* is given, only the metadata files with those names are read::
+
+            >>> e = Egg('pyg-0.4-py2.7.egg', members=['PKG-INFO'])
+            >>> e.files
+            ['PKG-INFO']
+
+        *cache* can be a :class:`MetadataCache` object: when the archive did not change since
+        it was cached, it is not opened at all.
+
+        If *mmap* is True the archive is memory-mapped: its central directory is parsed from the
+        mapping and the files stored without compression are not copied, the parser reads
+        them through :class:`memoryview` slices. In lazy mode, the files which are not parsed
+        by the constructor are copied before the archive is closed. ZIP64 archives are read normally.
     '''
 
-    def __init__(self, egg_path):
-        z = zipfile.ZipFile(egg_path)
+    def __init__(self, egg_path, lazy=False, members=None, cache=None, mmap=False):
         self.location = self._arg_name = os.path.abspath(egg_path)
-        super(Egg, self).__init__(zip_files(z, 'EGG-INFO'))
+        if self._from_cache(cache, members, lazy):
+            return
+        with span('pkg.archive.open', path=egg_path):
+            z = open_zip(egg_path, mmap)
+        try:
+            super(Egg, self).__init__(zip_files(z, 'EGG-INFO', members), lazy)
+        finally:
+            self._close_archive(z)
+        self._to_cache(cache, members)
+
+    def _read_file(self, name):
+        try:
+            z = open_zip(self.location)
+            try:
+                files = zip_files(z, 'EGG-INFO', [name])
+            finally:
+                z.close()
+        except (EnvironmentError, zipfile.BadZipfile):
+            return None
+        return files[0][0] if files else None
 
 
 class SDist(Dist):
@@ -269,19 +782,101 @@ class SDist(Dist):
         '1.1'
         >>> s.as_req()
         'pyg==0.4'
+
+    .. versionadded:: 0.8
+        Tarballs are read in a single streaming pass. If *members* is given, only the metadata
+        files with those names are read and the archive is not decompressed any further once
+        all of them have been found::
+
+            >>> s = SDist('pyg-0.4.tar.gz', members=['PKG-INFO', 'requires.txt'])
+            >>> s.files
+            ['PKG-INFO', 'requires.txt']
+
+        *cache* can be a :class:`MetadataCache` object and *mmap* is used by zip archives
+        (see :class:`Egg`).
     '''
 
-    def __init__(self, sdist_path):
-        e = ext(sdist_path)
-        if e == '.zip':
-            arch = zipfile.ZipFile(sdist_path)
-            func = zip_files
-        elif e.startswith('.tar'):
-            mode = 'r' if e == '.tar' else 'r:' + e.split('.')[2]
-            arch = tarfile.open(sdist_path, mode=mode)
-            func = tar_files
+    def __init__(self, sdist_path, lazy=False, members=None, cache=None, mmap=False):
         self.location = self._arg_name = os.path.abspath(sdist_path)
-        super(SDist, self).__init__(func(arch))
+        if self._from_cache(cache, members, lazy):
+            return
+        e = ext(sdist_path)
+        with span('pkg.archive.open', path=sdist_path):
+            if e == '.zip':
+                arch = open_zip(sdist_path, mmap)
+                read = lambda: zip_files(arch, wanted=members)
+            elif e.startswith('.tar'):
+                ## Stream mode: the archive is decompressed only up to the last file we need
+                mode = 'r|' if e == '.tar' else 'r|' + e.split('.')[2]
+                arch = tarfile.open(sdist_path, mode=mode)
+                read = lambda: tar_files(arch, members)
+        try:
+            super(SDist, self).__init__(read(), lazy)
+        finally:
+            self._close_archive(arch)
+        self._to_cache(cache, members)
+
+
+class Wheel(Dist):
+    '''
+    .. versionadded:: 0.8
+
+    Given the wheel path, returns a Dist object. The core metadata is read from the
+    :file:`METADATA` file of the :file:`.dist-info` directory, so :attr:`pkg_info` is equivalent to
+    ``Dist.file('METADATA')``, and :attr:`requires` is built from its ``Requires-Dist`` fields::
+
+        >>> w = Wheel('pyg-0.4-py2.py3-none-any.whl')
+        >>> w
+        <Wheel[pyg-0.4-py2.py3-none-any.whl] object at 157425036>
+        >>> w.files
+        ['METADATA', 'RECORD', 'WHEEL', 'entry_points.txt', 'top_level.txt']
+        >>> w.requires
+        {'install': frozenset(['setuptools', 'pkgtools>=0.3.1', 'argh>=0.14']), 'extras': {}}
+        >>> w.file('WHEEL')['Root-Is-Purelib']
+        'true'
+
+    Only the members listed in :attr:`MEMBERS` (or in *members*) are read: they are looked up
+    directly in the zip central directory, without scanning the other members.
+    *cache* and *mmap* work like in :class:`Egg`.
+    '''
+
+    MEMBERS = ('METADATA', 'RECORD', 'WHEEL', 'entry_points.txt', 'top_level.txt')
+    _pkg_info_name = 'METADATA'
+
+    def __init__(self, wheel_path, lazy=False, members=None, cache=None, mmap=False):
+        self.location = self._arg_name = os.path.abspath(wheel_path)
+        if self._from_cache(cache, members, lazy):
+            return
+        with span('pkg.archive.open', path=wheel_path):
+            z = open_zip(wheel_path, mmap)
+        try:
+            super(Wheel, self).__init__(self._read(z, members or self.MEMBERS), lazy)
+        finally:
+            self._close_archive(z)
+        self._to_cache(cache, members)
+
+    def _read(self, z, members):
+        ## The .dist-info directory is named after the first two parts of the
+        ## file name ('{name}-{version}-...whl'), otherwise look for it among the top-level entries
+        prefix = '-'.join(os.path.basename(self.location).split('-')[:2]) + '.dist-info/'
+        try:
+            z.getinfo(prefix + 'METADATA')
+        except KeyError:
+            for name in z.namelist():
+                if name.endswith('.dist-info/METADATA') and name.count('/') == 1:
+                    prefix = name[:-len('METADATA')]
+                    break
+            else:
+                raise ValueError('This wheel does not contain a .dist-info directory')
+        files = []
+        for name in members:
+            try:
+                info = z.getinfo(prefix + name)
+            except KeyError:
+                continue
+            with span('pkg.archive.read', member=info.filename):
+                files.append((z.read(info), name))
+        return files
 
 
 class Dir(Dist):
@@ -304,9 +899,9 @@ class Dir(Dist):
         }
     '''
 
-    def __init__(self, path):
+    def __init__(self, path, lazy=False):
         files = []
-        if not os.path.exists(os.path.join(path, 'PKG-INFO')):
+        if not os.path.exists(os.path.join(path, self._pkg_info_name)):
             raise ValueError('This directory does not contain metadata files')
         for f in os.listdir(path):
             if not os.path.isfile(os.path.join(path, f)):
@@ -316,7 +911,29 @@ class Dir(Dist):
             files.append((data, f))
         self._arg_name = os.path.normpath(path)
         self.location = os.path.abspath(path)
-        super(Dir, self).__init__(files)
+        super(Dir, self).__init__(files, lazy)
+
+    def _read_file(self, name):
+        try:
+            with open(os.path.join(self.location, name)) as fobj:
+                return fobj.read()
+        except EnvironmentError:
+            return None
+
+
+class DistInfoDir(Dir):
+    '''
+    .. versionadded:: 0.8
+
+    Given a :file:`.dist-info` directory path, returns a Dist object. The core metadata is read
+    from the :file:`METADATA` file, so :attr:`pkg_info` is equivalent to ``Dist.file('METADATA')``::
+
+        >>> d = DistInfoDir('/usr/lib/python3/dist-packages/six-1.16.0.dist-info')
+        >>> d.as_req
+        'six==1.16.0'
+    '''
+
+    _pkg_info_name = 'METADATA'
 
 
 class EggDir(Dir):
@@ -343,11 +960,57 @@ class EggDir(Dir):
         False
     '''
 
-    def __init__(self, path):
+    def __init__(self, path, lazy=False):
         path = os.path.join(path, 'EGG-INFO')
         if not os.path.exists(path):
             raise ValueError('Path does not exist: {0}'.format(path))
-        super(EggDir, self).__init__(path)
+        super(EggDir, self).__init__(path, lazy)
+
+
+## Module names, possibly dotted, and the extensions of the paths handled by _from_path
+_MODULE_NAME = re.compile(r'^[^\W\d]\w*(?:\.[^\W\d]\w*)*$', re.UNICODE)
+_DIST_EXTS = ('.egg', '.egg-info', '.dist-info', '.whl', '.zip', '.tar', '.tar.gz', '.tar.bz2')
+
+
+def _find_module(name):
+    ## Locates the top-level module *name* without importing (and executing) it.
+    ## Returns the path of its file, or None
+    if _MODULE_NAME.match(name) is None:
+        return None
+    name = name.split('.')[0]
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        pass
+    else:
+        try:
+            spec = find_spec(name)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is not None:
+            if spec.origin and os.path.isfile(spec.origin):
+                return spec.origin
+            ## Namespace packages have no origin, only their directories
+            if spec.submodule_search_locations:
+                return os.path.join(list(spec.submodule_search_locations)[0], '__init__.py')
+            return None
+    for entry in sys.path:
+        base = os.path.join(entry or os.curdir, name)
+        if os.path.isdir(base):
+            return os.path.join(base, '__init__.py')
+        for suffix in ('.py', '.pyc', '.so', '.pyd'):
+            if os.path.isfile(base + suffix):
+                return base + suffix
+    return None
+
+
+def _locate(package, names):
+    ## Returns the (name, file) pair of the first of *names* which can be found
+    for name in names:
+        path = _find_module(name)
+        if path is not None:
+            return name.split('.')[0], path
+    raise ValueError('cannot find {0}'.format(package))
 
 
 class Develop(Dir):
@@ -373,18 +1036,25 @@ class Develop(Dir):
         <Develop[/home/3jkldfi84r2hj/pyg/pyg.egg-info] object at 175354540>
         >>> d.files()
         ['requires.txt', 'PKG-INFO', 'SOURCES.txt', 'top_level.txt', 'dependency_links.txt', 'entry_points.txt']
+
+    .. versionadded:: 0.8
+        If *no_import* is True, the package is located without importing it (see :class:`Installed`).
     '''
 
-    def __init__(self, package):
-        if isinstance(package, str):
-            try:
-                package = __import__(package)
-            except ImportError:
-                raise ValueError('cannot import {0}'.format(package))
-        package_name = package.__package__
-        if package_name is None:
-            package_name = package.__name__
-        d = os.path.dirname(package.__file__)
+    def __init__(self, package, lazy=False, no_import=False):
+        if isinstance(package, str) and no_import:
+            package_name, package_file = _locate(package, (package,))
+        else:
+            if isinstance(package, str):
+                try:
+                    package = __import__(package)
+                except ImportError:
+                    raise ValueError('cannot import {0}'.format(package))
+            package_name = package.__package__
+            if package_name is None:
+                package_name = package.__name__
+            package_file = package.__file__
+        d = os.path.dirname(package_file)
         egg_info = package_name + '.egg-info'
         paths = [os.path.join(d, egg_info), os.path.join(d, '..', egg_info)]
         for p in paths:
@@ -393,7 +1063,7 @@ class Develop(Dir):
                 break
         else:
             raise ValueError('Cannot find metadata for {0}'.format(package_name))
-        super(Develop, self).__init__(path)
+        super(Develop, self).__init__(path, lazy)
 
 
 class Installed(Dir):
@@ -414,38 +1084,56 @@ class Installed(Dir):
         >>> i.files()
         ['top_level.txt', 'dependency_links.txt', 'PKG-INFO', 'SOURCES.txt']
 
+    .. versionadded:: 0.8
+        If *no_import* is True, the package is not imported: it is located with
+        :func:`importlib.util.find_spec` (or by scanning :data:`sys.path`), so none of its code
+        is executed. Namespace packages are supported::
+
+            >>> i = Installed('numpy', no_import=True)
+            >>> 'numpy' in sys.modules
+            False
+
     .. automethod:: installed_files
     '''
 
-    def __init__(self, package):
-        if isinstance(package, str):
-            try:
-                package = __import__(package)
-            except (ImportError, SystemExit):
+    def __init__(self, package, lazy=False, no_import=False):
+        if isinstance(package, str) and no_import:
+            package_name, package_file = _locate(package, (package, package.lower()))
+        else:
+            if isinstance(package, str):
                 try:
-                    package = __import__(package.lower())
+                    package = __import__(package)
                 except (ImportError, SystemExit):
-                    raise ValueError('cannot import {0}'.format(package))
-        package_name = package.__package__
-        if package_name is None:
-            package_name = package.__name__
-        base_patterns = ('{0}-*.egg-info', 'EGG-INFO')
+                    try:
+                        package = __import__(package.lower())
+                    except (ImportError, SystemExit):
+                        raise ValueError('cannot import {0}'.format(package))
+            package_name = package.__package__
+            if package_name is None:
+                package_name = package.__name__
+            package_file = package.__file__
+        base_patterns = ('{0}-*.egg-info', 'EGG-INFO', '{0}-*.dist-info')
         patterns = []
         for bp in base_patterns:
             patterns.extend([bp.format(n) for n in (package_name, package_name.capitalize())])
-        dir, name = os.path.split(package.__file__)
+        dir, name = os.path.split(package_file)
         candidates = []
-        for p in patterns:
-            for g in (os.path.join(d, p) for d in (dir, os.path.join(dir, '..'))):
-                candidates.extend(glob.glob(g))
+        with span('pkg.installed.glob', package=package_name):
+            for p in patterns:
+                for g in (os.path.join(d, p) for d in (dir, os.path.join(dir, '..'))):
+                    candidates.extend(glob.glob(g))
         for c in candidates:
             if os.path.exists(os.path.join(c, 'PKG-INFO')):
                 path = c
                 break
+            if c.endswith('.dist-info') and os.path.exists(os.path.join(c, 'METADATA')):
+                path = c
+                self._pkg_info_name = 'METADATA'
+                break
         else:
             raise ValueError('cannot find PKG-INFO for {0}'.format(package_name))
         self.package_name = package_name
-        super(Installed, self).__init__(path)
+        super(Installed, self).__init__(path, lazy)
 
     def installed_files(self):
         '''
@@ -499,12 +1187,77 @@ class Installed(Dir):
         return loc
 
 
+def _metadata_stat(location):
+    ## The stat of a file, or of a directory and the metadata file inside it:
+    ## editing PKG-INFO in place does not change the directory's mtime
+    st = os.stat(location)
+    fp = [(st.st_size, st.st_mtime)]
+    if os.path.isdir(location):
+        for name in ('PKG-INFO', 'METADATA', os.path.join('EGG-INFO', 'PKG-INFO')):
+            try:
+                st = os.stat(os.path.join(location, name))
+            except OSError:
+                continue
+            fp.append((name, st.st_size, st.st_mtime))
+    return tuple(fp)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _stat(path):
+    ## The stat of a metadata location (see _metadata_stat), or None
+    try:
+        return _metadata_stat(path)
+    except OSError:
+        return None
+
+
 class WorkingSet(object):
-    def __init__(self, entries=None, onerror=None, debug=None):
+    '''
+    Collects the installed distributions which have metadata files. :attr:`packages` maps every
+    distribution's name to a ``(path, dist)`` tuple.
+
+    .. versionadded:: 0.8
+        If *fast* is True, the distributions are not discovered by importing the packages:
+        every directory in *entries* (by default :data:`sys.path`) is scanned once for
+        :file:`*.egg-info`, :file:`*.dist-info` and :file:`*.egg` entries, which are loaded
+        lazily with :class:`Dir`, :class:`DistInfoDir`, :class:`EggDir` or :class:`Egg`.
+
+    .. automethod:: refresh
+
+    .. automethod:: save
+
+    .. automethod:: load
+
+    .. automethod:: by_name
+
+    .. automethod:: by_module
+
+    .. automethod:: by_entry_point
+    '''
+
+    ## Snapshots written by save() start with the magic string and the format version
+    SNAPSHOT_MAGIC = b'PKGTOOLS-WS'
+    SNAPSHOT_VERSION = 2
+    ## The parsed files which are not stored in snapshots, because of their size
+    SNAPSHOT_DEFERRED = ('PKG-INFO', 'METADATA', 'RECORD', 'SOURCES.txt', 'installed-files.txt')
+
+    def __init__(self, entries=None, onerror=None, debug=None, fast=False):
         self.packages = {}
+        self.entries = entries
         self.onerror = onerror or (lambda arg: None)
         self.debug = debug or (lambda arg: None)
-        self._find_packages()
+        self.fast = fast
+        if fast:
+            self._scan_entries()
+        else:
+            self._find_packages()
+        self._index()
 
     def _find_packages(self):
         for loader, package_name, ispkg in pkgutil.walk_packages(onerror=self.onerror):
@@ -524,9 +1277,317 @@ class WorkingSet(object):
                 continue
             self.packages[installed.name] = (path, installed)
 
+    def _entries(self):
+        for entry in (self.entries if self.entries is not None else sys.path):
+            yield os.path.abspath(entry or os.curdir)
+
+    def _scan_entries(self):
+        ## Every scanned entry is mapped to its mtime and to its candidate metadata paths,
+        ## every candidate to its fingerprint and to the loaded (path, dist) tuple
+        self._scanned = {}
+        self._loaded = {}
+        self.packages = self._collect()
+
+    def _collect(self):
+        packages = {}
+        scanned, loaded = {}, {}
+        for entry in self._entries():
+            if entry in scanned:
+                continue
+            mtime = _mtime(entry)
+            if mtime is None:
+                continue
+            old = self._scanned.get(entry)
+            if old is not None and old[0] == mtime:
+                candidates = old[1]
+            else:
+                candidates = self._candidates(entry)
+            scanned[entry] = (mtime, candidates)
+            for path, isdir in candidates:
+                if path in loaded:
+                    continue
+                ## Rewriting PKG-INFO in place does not change the directory's mtime
+                stat = _stat(path)
+                old = self._loaded.get(path)
+                if old is not None and old[0] == stat:
+                    item = old[1]
+                else:
+                    item = self._load(entry, path, isdir)
+                loaded[path] = (stat, item)
+                if item is None:
+                    continue
+                name = item[1].name
+                ## Like the import system, the first entry wins
+                if name in packages:
+                    self.debug('Duplicate distribution: {0}'.format(path))
+                    continue
+                packages[name] = item
+        self._scanned, self._loaded = scanned, loaded
+        return packages
+
+    def _candidates(self, entry):
+        if ext(entry) == '.egg':
+            ## An egg directly on sys.path
+            return [(entry, os.path.isdir(entry))]
+        try:
+            entries = [(e.path, e.is_dir()) for e in scandir(entry)]
+        except OSError:
+            return []
+        return [(path, isdir) for path, isdir in entries
+                if ext(path) in ('.egg-info', '.dist-info', '.egg')]
+
+    def _load(self, entry, path, isdir):
+        e = ext(path)
+        try:
+            if not isdir:
+                if e != '.egg':
+                    self.debug('Not a metadata directory: {0}'.format(path))
+                    return None
+                dist = Egg(path, lazy=True)
+            elif e == '.egg':
+                dist = EggDir(path, lazy=True)
+            elif e == '.dist-info':
+                dist = DistInfoDir(path, lazy=True)
+            else:
+                dist = Dir(path, lazy=True)
+            dist.name
+        except Exception as exc:
+            self.debug('Error on retrieving metadata from {0}: {1}'.format(path, exc))
+            return None
+        return self._package_path(entry, dist), dist
+
+    def _package_path(self, entry, dist):
+        ## The top-level package directory, when there is one
+        try:
+            top_level = dist.file('top_level.txt')
+        except KeyError:
+            top_level = []
+        for name in top_level:
+            path = os.path.join(entry, name)
+            if os.path.isdir(path):
+                return path
+        return dist.location
+
+    def refresh(self):
+        '''
+        .. versionadded:: 0.8
+
+        Updates :attr:`packages` to match the installed distributions. With *fast* discovery,
+        only the :data:`sys.path` entries whose modification time changed are scanned again,
+        and only the distributions whose metadata directory or :file:`PKG-INFO` (or
+        :file:`METADATA`) file changed are loaded again. Returns a dictionary with three sorted lists of names:
+
+            * added: new distributions
+            * removed: distributions which are not installed anymore
+            * upgraded: distributions whose version changed
+        '''
+
+        old = self.packages
+        if self.fast:
+            self.packages = self._collect()
+        else:
+            self.packages = {}
+            self._find_packages()
+        new = self.packages
+        self._index()
+        return {
+            'added': sorted(n for n in new if n not in old),
+            'removed': sorted(n for n in old if n not in new),
+            'upgraded': sorted(n for n in new if n in old and new[n][1].version != old[n][1].version),
+        }
+
+    def _fingerprint(self):
+        ## The mtime and the candidate metadata paths of every entry, and the stat of every
+        ## distribution's metadata location: rewriting PKG-INFO in place changes no mtime
+        locations = set(getattr(item[1], 'location', None) for item in self.packages.values())
+        locations.discard(None)
+        return {
+            'entries': [(entry, _mtime(entry), self._candidate_paths(entry)) for entry in self._entries()],
+            'locations': [(location, _stat(location)) for location in sorted(locations)],
+        }
+
+    def _changed(self, fingerprint):
+        ## When the mtime of an entry changed, its candidates are compared: other files
+        ## (like the snapshot itself) can be added to it without changing the distributions
+        entries = fingerprint['entries']
+        if [e[0] for e in entries] != list(self._entries()):
+            return True
+        for entry, mtime, candidates in entries:
+            if _mtime(entry) != mtime and self._candidate_paths(entry) != candidates:
+                return True
+        return any(_stat(location) != stat for location, stat in fingerprint['locations'])
+
+    def _candidate_paths(self, entry):
+        return sorted(path for path, isdir in self._candidates(entry))
+
+    def _snapshot_state(self, dist):
+        ## The raw files and the bulky parsed ones are left out: a dist loaded from the
+        ## snapshot reads them again when they are requested
+        state = dict(dist.__dict__)
+        state.pop('file_objects', None)
+        deferred = set(dist._deferred) | set(dist._pending)
+        deferred.update(name for name in dist.metadata if name in self.SNAPSHOT_DEFERRED)
+        state['metadata'] = dict((name, data) for name, data in dist.metadata.items() if name not in deferred)
+        state['_pending'] = {}
+        state['_deferred'] = tuple(sorted(deferred))
+        try:
+            state['_headers'] = {'Name': dist.name, 'Version': dist.version}
+        except KeyError:
+            pass
+        return state
+
+    def save(self, path):
+        '''
+        .. versionadded:: 0.8
+
+        Writes a snapshot of this working set to *path*: the distributions with the small metadata
+        files which have been parsed, and the modification times of the scanned :data:`sys.path`
+        entries and of the distributions' metadata files, so that :meth:`load` can rebuild it
+        without discovering the distributions again. The other files (like :file:`RECORD` or
+        :file:`SOURCES.txt`) are not stored: the distributions read them again when they are
+        requested.
+        The snapshot is a versioned :mod:`marshal` file, which is fast to read and shares
+        repeated strings. Like any marshal data, it must not come from an untrusted source.
+        '''
+
+        dists, ids = [], {}
+        def ref(item):
+            ## Dists are stored once and referenced by their index
+            if item is None:
+                return None
+            package_path, dist = item
+            if id(dist) not in ids:
+                ids[id(dist)] = len(dists)
+                dists.append((dist.__class__.__name__, self._snapshot_state(dist)))
+            return package_path, ids[id(dist)]
+        data = {
+            'entries': self.entries,
+            'fast': self.fast,
+            'fingerprint': self._fingerprint(),
+            'packages': dict((name, ref(item)) for name, item in self.packages.items()),
+        }
+        if self.fast:
+            data['scanned'] = self._scanned
+            data['loaded'] = dict((p, (mtime, ref(item))) for p, (mtime, item) in self._loaded.items())
+        data['dists'] = dists
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fobj:
+            fobj.write(self.SNAPSHOT_MAGIC + struct.pack('<H', self.SNAPSHOT_VERSION))
+            marshal.dump(data, fobj)
+        getattr(os, 'replace', os.rename)(tmp, path)
+
+    @classmethod
+    def load(cls, path, entries=None, onerror=None, debug=None, fast=False):
+        '''
+        .. versionadded:: 0.8
+
+        Returns the working set saved with :meth:`save` at *path*, which must have been built
+        with the same *entries* and *fast* arguments. If distributions were added to or removed
+        from the :data:`sys.path` entries, or if their metadata files changed since then, the
+        working set is refreshed (see :meth:`refresh`) or, without *fast* discovery, built again. If the snapshot cannot be read, it is ignored and the
+        working set is built from scratch::
+
+            >>> ws = WorkingSet.load('/var/cache/app/ws.snapshot', fast=True)
+            >>> ws.save('/var/cache/app/ws.snapshot')
+        '''
+
+        debug = debug or (lambda arg: None)
+        header = cls.SNAPSHOT_MAGIC + struct.pack('<H', cls.SNAPSHOT_VERSION)
+        try:
+            with open(path, 'rb') as fobj:
+                if fobj.read(len(header)) != header:
+                    raise ValueError('not a snapshot, or written by another version')
+                data = marshal.load(fobj)
+            if (data['entries'], data['fast']) != (entries, fast):
+                raise ValueError('built with other arguments')
+            dists = []
+            for class_name, state in data['dists']:
+                dist_cls = globals()[class_name]
+                if not (isinstance(dist_cls, type) and issubclass(dist_cls, Dist)):
+                    raise TypeError('not a Dist class: {0}'.format(class_name))
+                dist = dist_cls.__new__(dist_cls)
+                dist.__dict__.update(state)
+                dist.file_objects = []
+                dists.append(dist)
+        except (IOError, OSError, ValueError, EOFError, TypeError, KeyError) as e:
+            debug('Cannot load the snapshot {0}: {1}'.format(path, e))
+            return cls(entries, onerror, debug, fast)
+
+        def item(ref):
+            return None if ref is None else (ref[0], dists[ref[1]])
+        ws = cls.__new__(cls)
+        ws.entries = entries
+        ws.onerror = onerror or (lambda arg: None)
+        ws.debug = debug
+        ws.fast = fast
+        ws.packages = dict((name, item(ref)) for name, ref in data['packages'].items())
+        if fast:
+            ws._scanned = data['scanned']
+            ws._loaded = dict((p, (mtime, item(ref))) for p, (mtime, ref) in data['loaded'].items())
+        if ws._changed(data['fingerprint']):
+            debug('The snapshot {0} is stale'.format(path))
+            if not fast:
+                return cls(entries, onerror, debug, fast)
+            ## Only what changed is scanned again
+            ws.packages = ws._collect()
+        ws._index()
+        return ws
+
+    def _index(self):
+        self._names = {}
+        self._modules = {}
+        self._entry_points = {}
+        for name, item in list(self.packages.items()):
+            dist = item[1]
+            files = dist.files
+            try:
+                top_level = dist.file('top_level.txt') if 'top_level.txt' in files else []
+                entry_points = dist.file('entry_points.txt') if 'entry_points.txt' in files else {}
+            except Exception as e:
+                ## Like in _load, a malformed distribution is skipped
+                self.debug('Error on retrieving metadata from {0}: {1}'.format(dist.location, e))
+                del self.packages[name]
+                continue
+            self._names.setdefault(normalize_name(name), item)
+            for module in top_level:
+                self._modules.setdefault(module, item)
+            for group, entries in entry_points.items():
+                for ep in entries:
+                    self._entry_points.setdefault((group, ep), item)
+
     def get(self, package_name, default=None):
         return self.packages.get(package_name, default)
 
+    def by_name(self, name, default=None):
+        '''
+        .. versionadded:: 0.8
+
+        Like :meth:`get`, but *name* is normalized first, so that ``'Foo_Bar'`` finds ``'foo-bar'``.
+        '''
+
+        return self._names.get(normalize_name(name), default)
+
+    def by_module(self, module, default=None):
+        '''
+        .. versionadded:: 0.8
+
+        Returns the ``(path, dist)`` tuple of the distribution which provides the top-level
+        package of *module* (according to its :file:`top_level.txt` file).
+        '''
+
+        return self._modules.get(module.split('.')[0], default)
+
+    def by_entry_point(self, group, name, default=None):
+        '''
+        .. versionadded:: 0.8
+
+        Returns the ``(path, dist)`` tuple of the distribution which defines the entry point
+        *name* in *group*, for example ``ws.by_entry_point('console_scripts', 'pyg')``.
+        '''
+
+        ## ConfigParser lowercases the entry points names
+        return self._entry_points.get((group, name.lower()), default)
+
     def __contains__(self, item):
         return item in self.packages
 
@@ -541,29 +1602,217 @@ class WorkingSet(object):
         return len(self.packages)
 
 
-def get_metadata(pkg):
+def _from_path(path, lazy=False, cache=None):
+    e = ext(path)
+    if os.path.isdir(path):
+        if e == '.egg':
+            return EggDir(path, lazy)
+        if e == '.dist-info':
+            return DistInfoDir(path, lazy)
+        return Dir(path, lazy)
+    if e in ('.tar', '.tar.gz', '.tar.bz2', '.zip'):
+        return SDist(path, lazy, cache=cache)
+    elif e == '.egg':
+        return Egg(path, lazy, cache=cache)
+    elif e == '.whl':
+        return Wheel(path, lazy, cache=cache)
+    raise TypeError('Cannot return a Dist object')
+
+
+def get_metadata(pkg, lazy=False, cache=None, no_import=False):
     import types
 
     if type(pkg) is types.ModuleType:
-        return Installed(pkg)
+        return Installed(pkg, lazy)
     if isinstance(pkg, str):
-        try:
-            m = __import__(pkg)
-        except ImportError:
-            pass
+        is_module = _MODULE_NAME.match(pkg) is not None
+        ## 'mypkg.egg' and 'mypkg.egg-info' are paths, not the mypkg module
+        if os.path.exists(pkg) and (not is_module or ext(pkg) in _DIST_EXTS):
+            return _from_path(pkg, lazy, cache)
+        if not is_module:
+            found = False
+        elif no_import:
+            found = _find_module(pkg) is not None
         else:
             try:
-                return Installed(pkg)
+                m = __import__(pkg)
+            except ImportError:
+                found = False
+            else:
+                found = True
+        if found:
+            try:
+                return Installed(pkg, lazy, no_import)
             except ValueError:
-                return Develop(pkg)
+                return Develop(pkg, lazy, no_import)
         if os.path.exists(pkg):
-            e = ext(pkg)
-            if os.path.isdir(pkg):
-                if e == '.egg':
-                    return EggDir(pkg)
-                return Dir(pkg)
-            if e in ('.tar', '.tar.gz', '.tar.bz2', '.zip'):
-                return SDist(pkg)
-            elif e == '.egg':
-                return Egg(pkg)
-    raise TypeError('Cannot return a Dist object')
\ No newline at end of file
+            return _from_path(pkg, lazy, cache)
+    raise TypeError('Cannot return a Dist object')
+
+
+class MetadataLRU(object):
+    '''
+    .. versionadded:: 0.8
+
+    A memoized :func:`get_metadata`, which keeps the last *maxsize* Dist objects. Every call
+    checks the stat of the distribution's location (and of its :file:`PKG-INFO` or
+    :file:`METADATA` file), so an entry is used only if the metadata did not change on disk.
+    :data:`cached_get_metadata` is a shared instance::
+
+        >>> cached_get_metadata('pyg')  # Imports the package and reads the metadata
+        <Installed[pyg] object at 175527500>
+        >>> cached_get_metadata('pyg')  # A few stat calls
+        <Installed[pyg] object at 175527500>
+        >>> cached_get_metadata.cache_info()
+        CacheInfo(hits=1, misses=1, maxsize=128, currsize=1)
+
+    The returned objects are shared, so they should not be modified.
+
+    .. automethod:: cache_info
+
+    .. automethod:: cache_clear
+
+    .. automethod:: invalidate
+    '''
+
+    CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<MetadataLRU[{0}] object at {1}>'.format(self.maxsize, id(self))
+
+    def _key(self, pkg, lazy):
+        import types
+
+        if type(pkg) is types.ModuleType:
+            return 'module', pkg.__name__, lazy
+        if isinstance(pkg, str) and os.path.exists(pkg):
+            return 'path', os.path.abspath(pkg), lazy
+        return 'name', pkg, lazy
+
+    def __call__(self, pkg, lazy=False, cache=None, no_import=False):
+        key = self._key(pkg, lazy)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            location, stat, dist = entry
+            try:
+                valid = _metadata_stat(location) == stat
+            except OSError:
+                valid = False
+            if valid:
+                with self._lock:
+                    self.hits += 1
+                    self._entries[key] = entry
+                return dist
+        dist = get_metadata(pkg, lazy, cache, no_import)
+        try:
+            entry = (dist.location, _metadata_stat(dist.location), dist)
+        except OSError:
+            entry = None
+        with self._lock:
+            self.misses += 1
+            if entry is not None:
+                ## The most recently used entries are at the end
+                self._entries[key] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return dist
+
+    def cache_info(self):
+        '''
+        Returns a ``CacheInfo(hits, misses, maxsize, currsize)`` named tuple, like
+        :func:`functools.lru_cache`.
+        '''
+
+        with self._lock:
+            return self.CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def cache_clear(self):
+        '''
+        Removes all the entries and resets the statistics.
+        '''
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def invalidate(self, path):
+        '''
+        Removes the entries whose location is *path* (or inside it), or which were requested
+        with that path.
+        '''
+
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in list(self._entries):
+                location = self._entries[key][0]
+                if key[1] == path or location == path or location.startswith(path + os.sep):
+                    del self._entries[key]
+
+
+## A shared MetadataLRU: cached_get_metadata(pkg) is a memoized get_metadata(pkg)
+cached_get_metadata = MetadataLRU()
+
+
+def load_many(paths, workers=None, executor='process', onerror=None, lazy=False, cache=None):
+    '''
+    .. versionadded:: 0.8
+
+    Builds the Dist objects (:class:`Egg`, :class:`SDist`, :class:`Dir` or :class:`EggDir`) for all
+    the given *paths*, distributing the work among *workers* processes (or threads, if *executor*
+    is ``'thread'``). By default one worker per CPU is used.
+    Yields ``(path, dist)`` tuples as soon as they are ready, so the order is not preserved.
+    When a path cannot be loaded, *onerror* is called with the path and the exception, and the
+    other paths are loaded anyway::
+
+        >>> errors = []
+        >>> for path, dist in load_many(glob.glob('dist/*'), onerror=lambda p, e: errors.append(p)):
+        ...     print(dist.as_req)
+        pyg==0.4
+        pkgtools==0.6.2
+        >>> errors
+        ['dist/README']
+
+    *lazy* and *cache* are passed to the Dist constructors.
+    '''
+
+    import multiprocessing
+    from concurrent import futures
+
+    executors = {
+        'process': futures.ProcessPoolExecutor,
+        'thread': futures.ThreadPoolExecutor,
+    }
+    if executor not in executors:
+        raise ValueError('Invalid executor: {0}'.format(executor))
+    onerror = onerror or (lambda path, exc: None)
+    workers = workers or multiprocessing.cpu_count()
+    paths = iter(paths)
+    with executors[executor](workers) as pool:
+        ## Only a few paths per worker are submitted at once, so that
+        ## huge batches don't pile up in memory
+        running = {}
+        def submit(n):
+            for path in paths:
+                running[pool.submit(_from_path, path, lazy, cache)] = path
+                n -= 1
+                if not n:
+                    break
+        submit(workers * 4)
+        while running:
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for f in done:
+                path = running.pop(f)
+                try:
+                    dist = f.result()
+                except Exception as e:
+                    onerror(path, e)
+                else:
+                    yield path, dist
+            submit(len(done))
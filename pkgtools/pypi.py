@@ -1,12 +1,26 @@
+import os
 import sys
-from .utils import ext
+import time
+import errno
+import socket
+import select
+import hashlib
+import threading
+import collections
+from .utils import cache_dir, ext
+from .version import latest, sort_versions
+from .instrument import enabled, span
 
 if sys.version_info >= (3,):
     import xmlrpc.client as xmlrpclib
     import urllib.request as urllib2
+    import urllib.parse as urlparse
+    import http.client as httplib
 else:
     import xmlrpclib
     import urllib2
+    import urlparse
+    import httplib
 
 try:
     import simplejson as json
@@ -14,18 +28,528 @@ except ImportError:
     import json
 
 
-def pypi_client(index_url='http://pypi.python.org/pypi', *args, **kwargs):
+INDEX_URL = 'http://pypi.python.org/pypi'
+
+
+class _StreamingUnmarshaller(xmlrpclib.Unmarshaller):
+    ## When the response is an array, its items are moved to self.items as soon
+    ## as they are complete, instead of being accumulated on the stack.
+    ## self.array tells whether the response was an array at all
+
+    def __init__(self, *args, **kwargs):
+        xmlrpclib.Unmarshaller.__init__(self, *args, **kwargs)
+        self.items = collections.deque()
+        self.array = False
+        self._streaming = False
+
+    def start(self, tag, attrs):
+        if tag == 'array' and not self._marks:
+            self.array = self._streaming = True
+        xmlrpclib.Unmarshaller.start(self, tag, attrs)
+
+    def end(self, tag):
+        xmlrpclib.Unmarshaller.end(self, tag)
+        if not self._streaming:
+            return
+        if not self._marks:
+            self._streaming = False
+        elif len(self._marks) == 1 and len(self._stack) > self._marks[0]:
+            self.items.extend(self._stack[self._marks[0]:])
+            del self._stack[self._marks[0]:]
+
+
+class HTTPResponse(object):
+    '''
+    .. versionadded:: 0.8
+
+    A response returned by :class:`HTTPClient`. It has the :attr:`status`, :attr:`reason`,
+    :attr:`headers` and :attr:`body` attributes, and like the objects returned by ``urlopen``
+    it has the :meth:`geturl` and :meth:`read` methods.
+    '''
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def __repr__(self):
+        return '<HTTPResponse[{0} {1}] object at {2}>'.format(self.status, self.url, id(self))
+
+    def geturl(self):
+        return self.url
+
+    def read(self):
+        return self.body
+
+
+## Raised by Python 3 when the connection is closed before the status line
+_REMOTE_DISCONNECTED = getattr(httplib, 'RemoteDisconnected', ())
+
+
+def _retriable(exc, method):
+    ## Whether a request which failed on a reused connection can be sent again on a new one:
+    ## only if the server closed the idle connection before answering (never on timeouts)
+    if isinstance(exc, socket.error) and exc.errno == errno.EPIPE:
+        ## Closed before the request was sent
+        return True
+    if method not in HTTPClient.IDEMPOTENT:
+        ## The server may have read the request before closing the connection
+        return False
+    if isinstance(exc, httplib.BadStatusLine):
+        ## Closed before a single byte of the response arrived
+        return isinstance(exc, _REMOTE_DISCONNECTED) or not str(exc.line).strip("'")
+    return isinstance(exc, socket.error) and exc.errno == errno.ECONNRESET
+
+
+def _dropped(conn):
+    ## An idle connection is readable only if the server closed it (or sent garbage)
+    if conn.sock is None:
+        return False
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (ValueError, select.error):
+        return True
+
+
+class HTTPClient(object):
+    '''
+    .. versionadded:: 0.8
+
+    An HTTP/1.1 client which keeps a pool of persistent connections for every host, so that
+    many requests to the same index don't pay for a new connection each time.
+    At most *pool_size* idle connections are kept for each host; *timeout* is the default
+    timeout (in seconds) of every request. The client can be shared among threads and passed
+    to :func:`pypi_client`, :func:`real_name`, :class:`PyPIXmlRpc` and :class:`PyPIJson`.
+    Idle connections closed by the server are not reused. A request which fails because the
+    server closed a reused connection is sent again on a new one, unless its method is not
+    idempotent and the server may have read it::
+
+        >>> client = HTTPClient(pool_size=8, timeout=10)
+        >>> real_name('sphinx', client=client)
+        'Sphinx'
+        >>> PyPIJson('Sphinx', fast=True, client=client).retrieve()['info']['name']
+        'Sphinx'
+
+    .. automethod:: request
+
+    .. automethod:: open
+
+    .. automethod:: stream
+
+    .. automethod:: close
+    '''
+
+    REDIRECTS = (301, 302, 303, 307, 308)
+    IDEMPOTENT = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE')
+
+    def __init__(self, pool_size=4, timeout=None, max_redirects=5):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._pools = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<HTTPClient[{0}] object at {1}>'.format(self.pool_size, id(self))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _acquire(self, key):
+        with self._lock:
+            pool = self._pools[key]
+            while pool:
+                conn = pool.pop()
+                if not _dropped(conn):
+                    return conn, True
+                conn.close()
+        scheme, netloc = key
+        cls = httplib.HTTPSConnection if scheme == 'https' else httplib.HTTPConnection
+        return cls(netloc, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            if len(self._pools[key]) < self.pool_size:
+                self._pools[key].append(conn)
+                return
+        conn.close()
+
+    def _send(self, url, method, data, headers, timeout):
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        while True:
+            conn, reused = self._acquire(key)
+            if timeout is not None:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, path, data, headers)
+                resp = conn.getresponse()
+            except (httplib.HTTPException, socket.error) as e:
+                conn.close()
+                ## The server may have closed an idle connection: retry with another one
+                if reused and _retriable(e, method):
+                    continue
+                raise
+            return key, conn, resp
+
+    def _done(self, key, conn, resp, timeout):
+        ## Called once the whole response has been read
+        if resp.will_close:
+            conn.close()
+            return
+        if timeout is not None:
+            conn.timeout = self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(self.timeout)
+        self._release(key, conn)
+
+    def _request(self, url, method, data, headers, timeout):
+        with span('pypi.http', method=method, url=url):
+            key, conn, resp = self._send(url, method, data, headers, timeout)
+            try:
+                body = resp.read()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                raise
+            self._done(key, conn, resp, timeout)
+        return HTTPResponse(url, resp.status, resp.reason, resp.msg, body)
+
+    def request(self, url, data=None, headers=None, method=None, timeout=None):
+        '''
+        Sends a request and returns an :class:`HTTPResponse` object, whatever its status is.
+        *method* defaults to ``POST`` if *data* is given, ``GET`` otherwise.
+        Redirects are followed for ``GET`` and ``HEAD`` requests, and for 307 and 308 responses.
+        '''
+
+        method = method or ('POST' if data is not None else 'GET')
+        headers = headers or {}
+        for i in range(self.max_redirects + 1):
+            resp = self._request(url, method, data, headers, timeout)
+            location = resp.headers.get('Location')
+            if resp.status not in self.REDIRECTS or location is None or \
+                    (method not in ('GET', 'HEAD') and resp.status not in (307, 308)):
+                return resp
+            url = urlparse.urljoin(url, location)
+        raise urllib2.HTTPError(url, resp.status, 'Too many redirects', resp.headers, None)
+
+    def open(self, url, data=None, headers=None, method=None, timeout=None):
+        '''
+        Like :meth:`request`, but like ``urlopen`` it raises :exc:`HTTPError` when the server
+        responds with an error status.
+        '''
+
+        resp = self.request(url, data, headers, method, timeout)
+        if resp.status >= 400:
+            raise urllib2.HTTPError(resp.url, resp.status, resp.reason, resp.headers, None)
+        return resp
+
+    def stream(self, url, data=None, headers=None, method=None, timeout=None, chunk_size=64 * 1024):
+        '''
+        Sends a request and yields the response body in chunks of *chunk_size* bytes, as they
+        arrive. Redirects are not followed and :exc:`HTTPError` is raised on error statuses.
+        '''
+
+        method = method or ('POST' if data is not None else 'GET')
+        ## The span lasts until the whole body has been read, but the consumer's time is excluded
+        with span('pypi.http', method=method, url=url) as s:
+            key, conn, resp = self._send(url, method, data, headers or {}, timeout)
+            if resp.status >= 400:
+                conn.close()
+                raise urllib2.HTTPError(url, resp.status, resp.reason, resp.msg, None)
+            try:
+                while True:
+                    chunk = resp.read(chunk_size)
+                    if not chunk:
+                        break
+                    s.pause()
+                    try:
+                        yield chunk
+                    finally:
+                        s.resume()
+            except:
+                ## Also when the generator is closed early: the connection can't be reused
+                conn.close()
+                raise
+            self._done(key, conn, resp, timeout)
+
+    def close(self):
+        '''
+        Closes all the idle connections.
+        '''
+
+        with self._lock:
+            pools, self._pools = self._pools, collections.defaultdict(list)
+        for conns in pools.values():
+            for conn in conns:
+                conn.close()
+
+
+def _xmlrpc_span(request_body):
+    ## A span named after the called method, which is read only if someone is listening
+    if not enabled():
+        return span('pypi.xmlrpc')
+    head = request_body[:256]
+    if not isinstance(head, str):
+        head = head.decode('latin-1')
+    start = head.find('<methodName>') + len('<methodName>')
+    return span('pypi.xmlrpc.' + head[start:head.find('</methodName>', start)].strip())
+
+
+class _Transport(xmlrpclib.Transport):
+    ## The default transport, with timing hooks
+
+    def request(self, host, handler, request_body, verbose=False):
+        with _xmlrpc_span(request_body):
+            return xmlrpclib.Transport.request(self, host, handler, request_body, verbose)
+
+
+class PooledTransport(xmlrpclib.Transport):
+    '''
+    .. versionadded:: 0.8
+
+    An Xml-Rpc transport which sends the requests through an :class:`HTTPClient`.
+    '''
+
+    def __init__(self, client, scheme='http'):
+        xmlrpclib.Transport.__init__(self)
+        self.client = client
+        self.scheme = scheme
+
+    def request(self, host, handler, request_body, verbose=False):
+        url = '{0}://{1}{2}'.format(self.scheme, host, handler)
+        headers = {'Content-Type': 'text/xml', 'User-Agent': self.user_agent}
+        with _xmlrpc_span(request_body):
+            resp = self.client.request(url, request_body, headers, 'POST')
+            if resp.status != 200:
+                raise xmlrpclib.ProtocolError(url, resp.status, resp.reason, resp.headers)
+            p, u = self.getparser()
+            p.feed(resp.read())
+            p.close()
+            return u.close()
+
+
+class ResponseCache(object):
+    '''
+    .. versionadded:: 0.8
+
+    A cache for the responses of the PyPI Json API, used by :class:`PyPIJson`. The response
+    bodies are stored in *directory* (by default the :file:`http` subdirectory of
+    ``PKGTOOLS_CACHE_DIR`` or :file:`~/.cache/pkgtools`) together with their ``ETag`` and
+    ``Last-Modified`` headers, and the parsed data of the last *memory_size* responses used
+    is also kept in memory.
+
+    A response younger than *max_age* seconds is used without contacting the server.
+    Until it is *stale_while_revalidate* seconds older than that, it is still used but it is
+    revalidated in a background thread. Otherwise a conditional request is sent and, if the
+    server answers with ``304 Not Modified``, the stored data is reused.
+    When the stored bodies exceed *max_size* bytes the oldest responses are evicted::
+
+        >>> cache = ResponseCache(max_age=300, stale_while_revalidate=3600)
+        >>> PyPIJson('pyg', fast=True, cache=cache).retrieve()['info']['version']
+        '0.4'
+
+    .. automethod:: invalidate
+    '''
+
+    def __init__(self, directory=None, max_age=0, stale_while_revalidate=0,
+                 max_size=64 * 1024 * 1024, memory_size=256):
+        self.directory = cache_dir(directory, 'http')
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self._memory = collections.OrderedDict()
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        self._size = sum(os.path.getsize(path) for path in self._files())
+
+    def __repr__(self):
+        return '<ResponseCache[{0}] object at {1}>'.format(self.directory, id(self))
+
+    ## The directory can be shared with other caches: only the files with this suffix are
+    ## counted, evicted and removed
+    SUFFIX = '.response'
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + self.SUFFIX)
+
+    def _files(self):
+        paths = (os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                 if f.endswith(self.SUFFIX))
+        return [path for path in paths if os.path.isfile(path)]
+
+    def _remember(self, url, entry):
+        with self._lock:
+            ## The most recently used entries are at the end
+            self._memory.pop(url, None)
+            self._memory[url] = entry
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, url):
+        '''
+        Returns the stored entry for *url* (a dictionary with the ``data``, ``etag``,
+        ``last_modified`` and ``fetched`` keys), or None.
+        '''
+
+        with self._lock:
+            entry = self._memory.pop(url, None)
+        if entry is None:
+            path = self._path(url)
+            try:
+                with open(path, 'rb') as fobj:
+                    stored = json.loads(fobj.read().decode('utf-8'))
+                fetched = os.path.getmtime(path)
+            except (IOError, OSError, ValueError):
+                return None
+            entry = {
+                'data': json.loads(stored['body']),
+                'etag': stored['etag'],
+                'last_modified': stored['last_modified'],
+                'fetched': fetched,
+            }
+        self._remember(url, entry)
+        return entry
+
+    def set(self, url, body, etag=None, last_modified=None):
+        '''
+        Stores the response *body* for *url*, and returns its parsed data.
+        '''
+
+        entry = {
+            'data': json.loads(body),
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': time.time(),
+        }
+        stored = json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified,
+                             'body': body}).encode('utf-8')
+        path = self._path(url)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            with open(path, 'wb') as fobj:
+                fobj.write(stored)
+            self._size += len(stored)
+            if self._size > self.max_size:
+                self._evict()
+        self._remember(url, entry)
+        return entry['data']
+
+    def touch(self, url):
+        '''
+        Marks the entry for *url* as fresh, after the server confirmed it did not change.
+        '''
+
+        try:
+            os.utime(self._path(url), None)
+        except OSError:
+            pass
+        with self._lock:
+            if url in self._memory:
+                self._memory[url]['fetched'] = time.time()
+
+    def _evict(self):
+        for path in sorted(self._files(), key=os.path.getmtime):
+            if self._size <= self.max_size:
+                break
+            self._size -= os.path.getsize(path)
+            os.remove(path)
+        self._memory.clear()
+
+    def invalidate(self, url=None):
+        '''
+        Removes the stored response for *url*. If *url* is None, the whole cache is cleared.
+        '''
+
+        with self._lock:
+            if url is None:
+                paths = self._files()
+                self._memory.clear()
+            else:
+                paths = [self._path(url)]
+                self._memory.pop(url, None)
+            for path in paths:
+                if os.path.exists(path):
+                    self._size -= os.path.getsize(path)
+                    os.remove(path)
+
+    def retrieve(self, url, fetch):
+        ## *fetch* sends a (conditional) request: it receives the URL and a headers dict
+        ## and returns a (status, body, etag, last_modified) tuple
+        entry = self.get(url)
+        if entry is not None:
+            age = time.time() - entry['fetched']
+            if age < self.max_age:
+                return entry['data']
+            if age < self.max_age + self.stale_while_revalidate:
+                self._revalidate_later(url, entry, fetch)
+                return entry['data']
+        return self._revalidate(url, entry, fetch)
+
+    def _revalidate(self, url, entry, fetch):
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        status, body, etag, last_modified = fetch(url, headers)
+        if status == 304 and entry is not None:
+            self.touch(url)
+            return entry['data']
+        return self.set(url, body.decode('utf-8'), etag, last_modified)
+
+    def _revalidate_later(self, url, entry, fetch):
+        with self._lock:
+            if url in self._revalidating:
+                return
+            self._revalidating.add(url)
+
+        def target():
+            try:
+                self._revalidate(url, entry, fetch)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._revalidating.discard(url)
+        t = threading.Thread(target=target)
+        t.daemon = True
+        t.start()
+
+
+def pypi_client(index_url=INDEX_URL, *args, **kwargs):
     '''
     Builds a PyPI client from an *index_url*. `*args` and `**kwargs` will be passed directly to the ``ServerProxy`` constructor::
 
         >>> pypi = pypi_client()
         >>> pypi
         <ServerProxy for pypi.python.org/pypi>
+
+    .. versionadded:: 0.8
+        If the *client* keyword argument is an :class:`HTTPClient`, the requests are sent
+        through its pool of persistent connections.
     '''
 
-    return xmlrpclib.ServerProxy(index_url, xmlrpclib.Transport(), *args, **kwargs)
+    client = kwargs.pop('client', None)
+    if client is None:
+        transport = _Transport()
+    else:
+        transport = PooledTransport(client, urlparse.urlsplit(index_url).scheme)
+    return xmlrpclib.ServerProxy(index_url, transport, *args, **kwargs)
 
-def real_name(package_name, timeout=None):
+def real_name(package_name, timeout=None, client=None):
     '''
     Since the Xml-Rpc and the Json PyPI APIs require the real name of a package, this function finds it.
     For example, if you try :class:`PyPIXmlRpc` with a wrong package name, you will get nothing::
@@ -64,10 +588,17 @@ def real_name(package_name, timeout=None):
           File "/usr/lib/python2.7/urllib2.py", line 1160, in do_open
             raise URLError(err)
         URLError: <urlopen error timed out>
+
+    .. versionadded:: 0.8
+        The request is sent through *client*, an :class:`HTTPClient`, if it is given.
     '''
 
-    r = urllib2.Request('http://pypi.python.org/simple/{0}'.format(package_name))
-    return urllib2.urlopen(r, timeout=timeout).geturl().split('/')[-2]
+    url = 'http://pypi.python.org/simple/{0}'.format(package_name)
+    if client is not None:
+        return client.open(url, timeout=timeout).geturl().split('/')[-2]
+    r = urllib2.Request(url)
+    with span('pypi.http', method='GET', url=url):
+        return urllib2.urlopen(r, timeout=timeout).geturl().split('/')[-2]
 
 
 class PyPIXmlRpc(object):
@@ -85,10 +616,96 @@ class PyPIXmlRpc(object):
     .. automethod:: search
 
     .. automethod:: changelog
+
+    .. automethod:: changelog_last_serial
+
+    .. automethod:: changelog_since_serial
+
+    .. automethod:: iter_packages
+
+    .. automethod:: iter_changelog
+
+    .. automethod:: iter_changelog_since_serial
+
+    .. versionadded:: 0.8
+        The batch methods below group many calls into a few ``system.multicall`` requests.
+        Results are returned in input order; a call which failed is replaced by its
+        :exc:`xmlrpclib.Fault`::
+
+            >>> pypi = PyPIXmlRpc()
+            >>> pypi.package_releases_many(['pyg', 'pkgtools'])
+            [['0.4'], ['0.2']]
+
+    .. automethod:: package_releases_many
+
+    .. automethod:: release_urls_many
+
+    .. automethod:: release_data_many
     '''
 
     def __init__(self, *args, **kwargs):
         self._client = pypi_client(*args, **kwargs)
+        self._index_url = args[0] if args else kwargs.get('index_url', INDEX_URL)
+        self._http = kwargs.get('client')
+
+    def _post(self, body):
+        headers = {'Content-Type': 'text/xml', 'User-Agent': xmlrpclib.Transport.user_agent}
+        if self._http is not None:
+            for chunk in self._http.stream(self._index_url, body, headers):
+                yield chunk
+            return
+        with span('pypi.http', method='POST', url=self._index_url) as s:
+            resp = urllib2.urlopen(urllib2.Request(self._index_url, body, headers))
+            try:
+                while True:
+                    chunk = resp.read(64 * 1024)
+                    if not chunk:
+                        break
+                    s.pause()
+                    try:
+                        yield chunk
+                    finally:
+                        s.resume()
+            finally:
+                resp.close()
+
+    def _stream(self, method, params):
+        ## Calls *method* and yields the items of the returned array while it is downloaded
+        target = _StreamingUnmarshaller()
+        parser = xmlrpclib.ExpatParser(target)
+        with span('pypi.xmlrpc.' + method) as s:
+            for chunk in self._post(xmlrpclib.dumps(params, method).encode('utf-8')):
+                parser.feed(chunk)
+                while target.items:
+                    s.pause()
+                    try:
+                        yield target.items.popleft()
+                    finally:
+                        s.resume()
+            parser.close()
+            ## Raises Fault if the server answered with a fault
+            target.close()
+            if not target.array:
+                raise xmlrpclib.ResponseError('{0} did not return an array'.format(method))
+        while target.items:
+            yield target.items.popleft()
+
+    def _multicall(self, method, calls, batch_size):
+        results = []
+        calls = list(calls)
+        for i in range(0, len(calls), batch_size):
+            batch = calls[i:i + batch_size]
+            multicall = xmlrpclib.MultiCall(self._client)
+            for args in batch:
+                getattr(multicall, method)(*args)
+            response = multicall()
+            for j in range(len(batch)):
+                ## MultiCallIterator raises the faults when the items are accessed
+                try:
+                    results.append(response[j])
+                except xmlrpclib.Fault as fault:
+                    results.append(fault)
+        return results
 
     def list_packages(self):
         '''
@@ -112,10 +729,23 @@ class PyPIXmlRpc(object):
 
         return self._client.list_packages()
 
-    def package_releases(self, package_name, show_hidden=False):
+    def iter_packages(self):
+        '''
+        .. versionadded:: 0.8
+
+        Like :meth:`list_packages`, but the names are yielded while the response is parsed,
+        so that the whole list is never held in memory. Like the other streaming methods, it
+        raises ``Fault`` on a fault response and ``ResponseError`` if the result is not an array.
+        '''
+
+        return self._stream('list_packages', ())
+
+    def package_releases(self, package_name, show_hidden=False, sort=False):
         '''
         Retrieve a list of the releases registered for the given package_name.
-        Returns a list with all version strings if *show_hidden* is True or only the non-hidden ones otherwise::
+        Returns a list with all version strings if *show_hidden* is True or only the non-hidden ones otherwise.
+        If *sort* is True the versions are sorted from the newest to the oldest (see
+        :func:`pkgtools.version.sort_versions`)::
 
             >>> pypi = PyPIXmlRpc()
             >>> pypi.package_releases('Sphinx')
@@ -130,9 +760,28 @@ class PyPIXmlRpc(object):
             ['0.2']
             >>> pypi.package_releases('pkgtools', True)
             ['0.2', '0.1']
+            >>> pypi.package_releases('Sphinx', True, sort=True)[:4]
+            ['1.0.7', '1.0.6', '1.0.5', '1.0.4']
+
+        .. versionchanged:: 0.8
+            Added the *sort* argument.
         '''
 
-        return self._client.package_releases(package_name, show_hidden)
+        releases = self._client.package_releases(package_name, show_hidden)
+        if sort:
+            return sort_versions(releases, reverse=True)
+        return releases
+
+    def package_releases_many(self, package_names, show_hidden=False, batch_size=100, sort=False):
+        '''
+        Like :meth:`package_releases`, for all the packages in *package_names*.
+        Sends one request every *batch_size* packages.
+        '''
+
+        results = self._multicall('package_releases', ((n, show_hidden) for n in package_names), batch_size)
+        if sort:
+            return [sort_versions(r, reverse=True) if isinstance(r, list) else r for r in results]
+        return results
 
     def release_urls(self, package_name, version):
         '''
@@ -166,6 +815,14 @@ class PyPIXmlRpc(object):
 
         return self._client.release_urls(package_name, version)
 
+    def release_urls_many(self, releases, batch_size=100):
+        '''
+        Like :meth:`release_urls`, for all the ``(package_name, version)`` tuples in *releases*.
+        Sends one request every *batch_size* releases.
+        '''
+
+        return self._multicall('release_urls', releases, batch_size)
+
     def release_data(self, package_name, version):
         '''
         Retrieve metadata describing a specific package release. Returns a dict with keys for:
@@ -216,6 +873,14 @@ class PyPIXmlRpc(object):
 
         return self._client.release_data(package_name, version)
 
+    def release_data_many(self, releases, batch_size=100):
+        '''
+        Like :meth:`release_data`, for all the ``(package_name, version)`` tuples in *releases*.
+        Sends one request every *batch_size* releases.
+        '''
+
+        return self._multicall('release_data', releases, batch_size)
+
     def search(self, spec, operator='and'):
         '''
         Search the package database using the indicated search *spec*.
@@ -249,22 +914,70 @@ class PyPIXmlRpc(object):
 
         return self._client.changelog(since)
 
+    def iter_changelog(self, since):
+        '''
+        .. versionadded:: 0.8
+
+        Like :meth:`changelog`, but the ``(name, version, timestamp, action)`` tuples are
+        yielded while the response is parsed.
+        '''
+
+        for change in self._stream('changelog', (since,)):
+            yield tuple(change)
+
+    def changelog_last_serial(self):
+        '''
+        .. versionadded:: 0.8
+
+        Retrieve the serial of the last event in the changelog. Every event has a serial, which
+        increases with every change: unlike timestamps, serials identify a position in the
+        changelog exactly.
+        '''
+
+        return self._client.changelog_last_serial()
+
+    def changelog_since_serial(self, since_serial):
+        '''
+        .. versionadded:: 0.8
+
+        Retrieve a list of five-tuples (name, version, timestamp, action, serial) of the events
+        which came after the one with the serial *since_serial*.
+        '''
+
+        return self._client.changelog_since_serial(since_serial)
+
+    def iter_changelog_since_serial(self, since_serial):
+        '''
+        .. versionadded:: 0.8
+
+        Like :meth:`changelog_since_serial`, but the tuples are yielded while the response is parsed.
+        '''
+
+        for change in self._stream('changelog_since_serial', (since_serial,)):
+            yield tuple(change)
+
 
 class PyPIJson(object):
     '''
     Use Json to interoperate with PyPI.
+
+    .. versionadded:: 0.8
+        If *client* is an :class:`HTTPClient`, all the requests are sent through it.
+        If *cache* is a :class:`ResponseCache`, the responses of :meth:`retrieve` are cached.
     '''
 
     URL = 'http://pypi.python.org/pypi/{0}/json'
 
-    def __init__(self, package_name, fast=False):
+    def __init__(self, package_name, fast=False, client=None, cache=None):
         self.package_name = package_name
+        self.client = client
+        self.cache = cache
 
         # If we don't want to be really fast, we can check if the package name
         # is the real name (because if we don't use the real name it won't work).
         # If we are sure that `package_name` is the real name we can set `fast=True`
         if not fast:
-            self.package_name = real_name(package_name)
+            self.package_name = real_name(package_name, client=client)
 
     def __repr__(self):
         return '<PyPIJson[{0}] object at {1}>'.format(self.package_name, id(self))
@@ -275,21 +988,72 @@ class PyPIJson(object):
         dictionary.
         '''
         def _request(url, timeout=None):
-            return urllib2.urlopen(url, timeout=timeout).read()
+            if self.client is not None:
+                return self.client.open(url, timeout=timeout).read()
+            with span('pypi.http', method='GET', url=url):
+                return urllib2.urlopen(url, timeout=timeout).read()
         if req_func is None:
             req_func = _request
         url = self.URL.format(self.package_name + ('/{0}'.format(version)
                                                    if version else ''))
+        if self.cache is not None and req_func is _request:
+            return self.cache.retrieve(url, lambda url, headers: self._fetch(url, headers, timeout))
         data = req_func(url, timeout).decode('utf-8')
         json_data = json.loads(data)
         return json_data
 
+    def _fetch(self, url, headers, timeout=None):
+        ## A conditional request, for the ResponseCache
+        if self.client is not None:
+            resp = self.client.request(url, headers=headers, timeout=timeout)
+            if resp.status >= 400:
+                raise urllib2.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            status, body, info = resp.status, resp.body, resp.headers
+        else:
+            with span('pypi.http', method='GET', url=url):
+                try:
+                    resp = urllib2.urlopen(urllib2.Request(url, headers=headers), timeout=timeout)
+                except urllib2.HTTPError as e:
+                    if e.code != 304:
+                        raise
+                    return 304, None, None, None
+                status, body, info = resp.getcode(), resp.read(), resp.info()
+        return status, body, info.get('ETag'), info.get('Last-Modified')
+
     def find(self, version=None):
         '''
         Find the distribution's files for the release specified by `version`.
         '''
         data = self.retrieve(version=version)
-        version = data['info']['version']
-        for release in data['urls']:
-            yield version, release['filename'], release['md5_digest'], \
-                release['url'], ext(release['filename'])
+        for release in _releases(data):
+            yield release
+
+    def versions(self, sort=True):
+        '''
+        .. versionadded:: 0.8
+
+        Returns the versions of all the package's releases, from the newest to the oldest
+        unless *sort* is False.
+        '''
+
+        versions = list(self.retrieve()['releases'])
+        if sort:
+            return sort_versions(versions, reverse=True)
+        return versions
+
+    def latest(self, prereleases=False):
+        '''
+        .. versionadded:: 0.8
+
+        Returns the newest version of the package (see :func:`pkgtools.version.latest`).
+        '''
+
+        return latest(self.retrieve()['releases'], prereleases)
+
+
+def _releases(data):
+    ## The (version, filename, md5, url, ext) tuples of the release described by JSON *data*
+    version = data['info']['version']
+    for release in data['urls']:
+        yield version, release['filename'], release['md5_digest'], \
+            release['url'], ext(release['filename'])
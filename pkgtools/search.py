@@ -0,0 +1,187 @@
+'''
+A local index which answers the same queries as :meth:`pkgtools.pypi.PyPIXmlRpc.search`,
+without contacting the server.
+'''
+
+import re
+import sqlite3
+import threading
+
+
+FIELDS = ('name', 'version', 'author', 'author_email', 'maintainer', 'maintainer_email',
+          'home_page', 'license', 'summary', 'description', 'keywords', 'platform',
+          'download_url', 'classifiers')
+
+## The PKG-INFO keys of the fields above
+PKG_INFO_FIELDS = {
+    'Name': 'name',
+    'Version': 'version',
+    'Author': 'author',
+    'Author-email': 'author_email',
+    'Maintainer': 'maintainer',
+    'Maintainer-email': 'maintainer_email',
+    'Home-page': 'home_page',
+    'License': 'license',
+    'Summary': 'summary',
+    'Description': 'description',
+    'Keywords': 'keywords',
+    'Platform': 'platform',
+    'Download-URL': 'download_url',
+    'Classifier': 'classifiers',
+}
+
+
+def _tokenize(value):
+    return set(re.findall(r'\w+', value.lower(), re.UNICODE))
+
+
+class SearchIndex(object):
+    '''
+    An inverted index of release metadata, stored in an SQLite database at *path* (by default
+    in memory). It can be built from :meth:`~pkgtools.pypi.PyPIXmlRpc.release_data` dictionaries
+    (or the ``info`` dictionaries of the Json API) and from :class:`pkgtools.pkg.Dist` objects::
+
+        >>> index = SearchIndex('search.db')
+        >>> index.add_releases(pypi.release_data_many(releases))
+        >>> index.add_dist(Installed('pkgtools'))
+        >>> index.search({'name': 'pkg', 'summary': 'tools'})
+        [{'name': 'pkgtools', 'version': '0.7.2', 'summary': 'Python Packages Tools'}]
+
+    .. automethod:: add_release
+
+    .. automethod:: add_releases
+
+    .. automethod:: add_dist
+
+    .. automethod:: remove
+
+    .. automethod:: search
+    '''
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS releases (id INTEGER PRIMARY KEY, {0}, '
+                             'UNIQUE (name, version))'.format(', '.join(FIELDS)))
+            self._db.execute('CREATE TABLE IF NOT EXISTS terms (field TEXT, term TEXT, release INTEGER)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS terms_index ON terms (field, term)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS terms_release ON terms (release)')
+
+    def __repr__(self):
+        return '<SearchIndex[{0}] object at {1}>'.format(self.path, id(self))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM releases').fetchone()[0]
+
+    def _remove(self, name, version):
+        ids = [r[0] for r in self._db.execute('SELECT id FROM releases WHERE name = ? AND version = ?',
+                                                (name, version))]
+        for id in ids:
+            self._db.execute('DELETE FROM terms WHERE release = ?', (id,))
+            self._db.execute('DELETE FROM releases WHERE id = ?', (id,))
+
+    def _add(self, data):
+        if not data or not data.get('name'):
+            return
+        values = []
+        for field in FIELDS:
+            value = data.get(field) or ''
+            if isinstance(value, (list, tuple)):
+                value = '\n'.join(value)
+            values.append(value)
+        self._remove(data['name'], data.get('version') or '')
+        cursor = self._db.execute('INSERT INTO releases ({0}) VALUES ({1})'.format(
+            ', '.join(FIELDS), ', '.join('?' * len(FIELDS))), values)
+        id = cursor.lastrowid
+        self._db.executemany('INSERT INTO terms VALUES (?, ?, ?)',
+                             [(field, term, id) for field, value in zip(FIELDS, values)
+                              for term in _tokenize(value)])
+
+    def add_release(self, data):
+        '''
+        Indexes a release from a :meth:`~pkgtools.pypi.PyPIXmlRpc.release_data` dictionary.
+        If the release is already in the index, it is replaced.
+        '''
+
+        self.add_releases([data])
+
+    def add_releases(self, releases):
+        '''
+        Indexes many releases at once (see :meth:`add_release`). Faults returned by
+        :meth:`~pkgtools.pypi.PyPIXmlRpc.release_data_many` are skipped.
+        '''
+
+        with self._lock:
+            with self._db:
+                for data in releases:
+                    if isinstance(data, dict):
+                        self._add(data)
+
+    def add_dist(self, dist):
+        '''
+        Indexes a :class:`pkgtools.pkg.Dist` object, using its :attr:`~pkgtools.pkg.Dist.pkg_info`.
+        '''
+
+        pkg_info = dist.pkg_info
+        self.add_release(dict((PKG_INFO_FIELDS[k], v) for k, v in pkg_info.items() if k in PKG_INFO_FIELDS))
+
+    def remove(self, name, version):
+        with self._lock:
+            with self._db:
+                self._remove(name, version)
+
+    def _match(self, field, value):
+        ## Every word of *value* must be the prefix of a word of *field*
+        ids = None
+        for token in _tokenize(value):
+            rows = self._db.execute('SELECT release FROM terms WHERE field = ? AND term >= ? AND term < ?',
+                                    (field, token, token + u'\uffff'))
+            found = set(r[0] for r in rows)
+            ids = found if ids is None else ids & found
+            if not ids:
+                break
+        return ids or set()
+
+    def search(self, spec, operator='and'):
+        '''
+        Searches the index, like :meth:`pkgtools.pypi.PyPIXmlRpc.search`. *spec* maps field names
+        to a string or to a list of strings (combined with OR), and the fields are combined
+        with *operator* (``'and'`` or ``'or'``). Invalid keys are ignored. A string matches when
+        each of its words is the beginning of a word of the field, case-insensitively, which
+        is suitable for search-as-you-type.
+
+        Returns a list of dicts ``{'name': ..., 'version': ..., 'summary': ...}``.
+        '''
+
+        if operator not in ('and', 'or'):
+            raise ValueError('Invalid operator: {0}'.format(operator))
+        result = None
+        with self._lock:
+            for field, values in spec.items():
+                if field not in FIELDS:
+                    continue
+                if not isinstance(values, (list, tuple)):
+                    values = [values]
+                ids = set()
+                for value in values:
+                    ids |= self._match(field, value)
+                if result is None:
+                    result = ids
+                elif operator == 'and':
+                    result &= ids
+                else:
+                    result |= ids
+            if not result:
+                return []
+            rows = []
+            result = list(result)
+            ## SQLite limits the number of parameters of a query
+            for i in range(0, len(result), 500):
+                chunk = result[i:i + 500]
+                rows.extend(self._db.execute('SELECT name, version, summary FROM releases WHERE id IN ({0})'
+                                             .format(', '.join('?' * len(chunk))), chunk))
+        rows.sort()
+        return [{'name': name, 'version': version, 'summary': summary} for name, version, summary in rows]
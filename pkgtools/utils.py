@@ -1,4 +1,11 @@
 import os
+import re
+import mmap
+import zlib
+import struct
+import zipfile
+
+from .instrument import span
 
 
 def name_ext(path):
@@ -13,14 +20,192 @@ def name(path):
 def ext(path):
     return name_ext(path)[1]
 
-## The search parameter is for Egg files, since they have a different structure
+def normalize_name(name):
+    ## PEP 503 normalization: 'Foo.Bar', 'foo_bar' and 'FOO-bar' are the same project
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def cache_dir(directory=None, name=''):
+    ## The directory used by the caches: *directory* if given, otherwise the *name*
+    ## subdirectory of $PKGTOOLS_CACHE_DIR or ~/.cache/pkgtools. It is created if needed
+    if directory is None:
+        base = os.environ.get('PKGTOOLS_CACHE_DIR') or \
+            os.path.join(os.path.expanduser('~'), '.cache', 'pkgtools')
+        directory = os.path.join(base, name) if name else base
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return directory
+
+## os.scandir is much faster than os.listdir + os.path.isdir, but it is
+## not available before Python 3.5
+
+class _DirEntry(object):
+    def __init__(self, dirname, name):
+        self.name = name
+        self.path = os.path.join(dirname, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+def scandir(path):
+    try:
+        return os.scandir(path)
+    except AttributeError:
+        return [_DirEntry(path, n) for n in os.listdir(path)]
+
+## The search parameter is for Egg files, since they have a different structure.
+## When *wanted* is a collection of file names, only those files are read and the
+## archive is not scanned any further once all of them have been found.
+
+def zip_files(zf, search='egg-info', wanted=None):
+    if wanted is not None:
+        wanted = set(wanted)
+    files = []
+    for info in zf.infolist():
+        n = info.filename
+        if search not in n:
+            continue
+        base = os.path.basename(n)
+        if wanted is not None:
+            if base not in wanted:
+                continue
+            wanted.discard(base)
+        with span('pkg.archive.read', member=n):
+            files.append((zf.read(info), base))
+        if wanted is not None and not wanted:
+            break
+    return files
+
+def tar_files(tf, wanted=None):
+    ## Members are visited in order, so that streaming archives (opened
+    ## with a 'r|*' mode) are read in a single pass
+    if wanted is not None:
+        wanted = set(wanted)
+    files = []
+    ## Walking a compressed archive decompresses it: the walk is timed apart from the reads
+    with span('pkg.archive.walk') as s:
+        for member in tf:
+            n = member.name
+            if 'egg-info' not in n or n.endswith('egg-info') or not member.isfile():
+                continue
+            base = os.path.basename(n)
+            if wanted is not None:
+                if base not in wanted:
+                    continue
+                wanted.discard(base)
+            s.pause()
+            try:
+                with span('pkg.archive.read', member=n):
+                    files.append((tf.extractfile(member).read(), base))
+            finally:
+                s.resume()
+            if wanted is not None and not wanted:
+                break
+    return files
+
+## A zip archive read through mmap: the central directory is parsed straight from the
+## mapping and stored members are returned as memoryview slices of it, without copying.
+## The mapping cannot be closed while the slices are alive, so the callers must release
+## (or copy) them before calling close().
+## It has the subset of the ZipFile interface used by the Dist classes. Archives which
+## need ZIP64 raise zipfile.BadZipfile (see open_zip); members compressed with something
+## other than deflate are read with a regular ZipFile.
+
+_EOCD = struct.Struct('<4s4H2LH')
+_CENTRAL = struct.Struct('<4s6H3L5H2L')
+_LOCAL = struct.Struct('<4s5H3L2H')
+
+class MappedZipFile(object):
+    def __init__(self, path):
+        self.filename = path
+        self._zipfile = None
+        with open(path, 'rb') as fobj:
+            try:
+                self._map = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                ## Empty files cannot be mapped
+                raise zipfile.BadZipfile('File is not a zip file')
+        try:
+            self._infos = self._read_central_directory()
+        except Exception:
+            self._map.close()
+            raise
+        self.NameToInfo = dict((info.filename, info) for info in self._infos)
+
+    def _read_central_directory(self):
+        m = self._map
+        eocd = m.rfind(b'PK\x05\x06', max(0, len(m) - _EOCD.size - 65535))
+        if eocd < 0 or eocd + _EOCD.size > len(m):
+            raise zipfile.BadZipfile('File is not a zip file')
+        (_, _, _, _, count, cd_size, cd_offset, _) = _EOCD.unpack_from(m, eocd)
+        if count == 0xffff or cd_offset == 0xffffffff or m.rfind(b'PK\x06\x07', max(0, eocd - 20), eocd) >= 0:
+            raise zipfile.BadZipfile('ZIP64 archives are not supported')
+        ## Data prepended to the archive (like in self-extracting archives) shifts all the offsets
+        concat = eocd - cd_size - cd_offset
+        infos = []
+        pos = cd_offset + concat
+        for i in range(count):
+            fields = _CENTRAL.unpack_from(m, pos)
+            if fields[0] != b'PK\x01\x02':
+                raise zipfile.BadZipfile('Bad magic number for central directory')
+            flags, method = fields[3], fields[4]
+            name_len, extra_len, comment_len = fields[10], fields[11], fields[12]
+            name = m[pos + _CENTRAL.size:pos + _CENTRAL.size + name_len]
+            info = zipfile.ZipInfo(name.decode('utf-8' if flags & 0x800 else 'cp437'))
+            info.flag_bits = flags
+            info.compress_type = method
+            info.CRC, info.compress_size, info.file_size = fields[7], fields[8], fields[9]
+            info.header_offset = fields[16] + concat
+            infos.append(info)
+            pos += _CENTRAL.size + name_len + extra_len + comment_len
+        return infos
+
+    def infolist(self):
+        return list(self._infos)
+
+    def namelist(self):
+        return [info.filename for info in self._infos]
+
+    def getinfo(self, name):
+        try:
+            return self.NameToInfo[name]
+        except KeyError:
+            raise KeyError('There is no item named {0!r} in the archive'.format(name))
+
+    def read(self, name):
+        info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+        if info.flag_bits & 0x1:
+            raise RuntimeError('File {0!r} is encrypted'.format(info.filename))
+        fields = _LOCAL.unpack_from(self._map, info.header_offset)
+        if fields[0] != b'PK\x03\x04':
+            raise zipfile.BadZipfile('Bad magic number for file header')
+        start = info.header_offset + _LOCAL.size + fields[9] + fields[10]
+        data = memoryview(self._map)[start:start + info.compress_size]
+        if info.compress_type == zipfile.ZIP_STORED:
+            return data
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -15)
+            if zlib.crc32(data) & 0xffffffff != info.CRC:
+                raise zipfile.BadZipfile('Bad CRC-32 for file {0!r}'.format(info.filename))
+            return data
+        if self._zipfile is None:
+            self._zipfile = zipfile.ZipFile(self.filename)
+        return self._zipfile.read(info.filename)
 
-def zip_files(zf, search='egg-info'):
-    names = [n for n in zf.namelist() if search in n]
-    fobj_list = [zf.read(n) for n in names]
-    return list(zip(fobj_list, map(os.path.basename, names)))
+    def close(self):
+        if self._zipfile is not None:
+            self._zipfile.close()
+        try:
+            self._map.close()
+        except BufferError:
+            ## Some slices are still in use (the caller failed before releasing them):
+            ## the mapping is released with them
+            pass
 
-def tar_files(tf):
-    names = [n for n in tf.getnames() if 'egg-info' in n and not n.endswith('egg-info')]
-    fobj_list = [tf.extractfile(n).read() for n in names]
-    return list(zip(fobj_list, map(os.path.basename, names)))
\ No newline at end of file
+def open_zip(path, use_mmap=False):
+    ## A MappedZipFile if *use_mmap* is True and the archive can be mapped, a ZipFile otherwise
+    if use_mmap:
+        try:
+            return MappedZipFile(path)
+        except (zipfile.BadZipfile, EnvironmentError):
+            pass
+    return zipfile.ZipFile(path)
@@ -0,0 +1,132 @@
+'''
+PEP 440 version parsing. Versions are turned into tuples which compare like the versions
+they represent, and these sort keys are cached, so that every string is parsed only once.
+'''
+
+import re
+
+
+_VERSION = re.compile(r'''
+    ^\s*v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:[-_.]?(?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?:-(?P<post_n1>[0-9]+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?)?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$''', re.VERBOSE | re.IGNORECASE)
+
+## a < b < rc, and the missing segments sort before or after all of them
+_PRE = {'a': 0, 'alpha': 0, 'b': 1, 'beta': 1, 'c': 2, 'rc': 2, 'pre': 2, 'preview': 2}
+
+_cache = {}
+_CACHE_SIZE = 100000
+
+
+def _number(n):
+    return int(n) if n else 0
+
+
+def _legacy_key(version):
+    ## Versions which are not valid PEP 440 versions sort before all the valid ones
+    parts = []
+    for part in re.findall(r'\d+|[a-z]+', version.lower()):
+        parts.append((1, int(part), '') if part.isdigit() else (0, 0, part))
+    return (0, tuple(parts))
+
+
+def _key(version):
+    match = _VERSION.match(version)
+    if match is None:
+        return _legacy_key(version)
+    g = match.groupdict()
+    release = [int(n) for n in g['release'].split('.')]
+    while len(release) > 1 and not release[-1]:
+        release.pop()
+    if g['pre_l']:
+        pre = (_PRE[g['pre_l'].lower()], _number(g['pre_n']))
+    elif g['dev_l'] and not (g['post_l'] or g['post_n1']):
+        ## 1.0.dev1 < 1.0a1
+        pre = (-1, 0)
+    else:
+        pre = (3, 0)
+    if g['post_n1']:
+        post = int(g['post_n1'])
+    elif g['post_l']:
+        post = _number(g['post_n2'])
+    else:
+        post = -1
+    dev = (0, _number(g['dev_n'])) if g['dev_l'] else (1, 0)
+    local = ()
+    if g['local']:
+        local = tuple((1, int(p), '') if p.isdigit() else (0, 0, p.lower())
+                      for p in re.split(r'[-_.]', g['local']))
+    return (1, _number(g['epoch']), tuple(release), pre, post, dev, local)
+
+
+def parse_version(version):
+    '''
+    .. versionadded:: 0.8
+
+    Returns the sort key of *version*, a tuple which compares like the version::
+
+        >>> parse_version('1.0.10') > parse_version('1.0.9')
+        True
+        >>> parse_version('1.0rc1') < parse_version('1.0') < parse_version('1.0.post1')
+        True
+
+    Versions which are not valid according to PEP 440 are supported, but they sort before
+    all the valid ones. The keys are cached.
+    '''
+
+    try:
+        return _cache[version]
+    except KeyError:
+        if len(_cache) >= _CACHE_SIZE:
+            _cache.clear()
+        key = _cache[version] = _key(version)
+        return key
+
+
+def is_prerelease(version):
+    '''
+    .. versionadded:: 0.8
+
+    Returns True if *version* is a pre-release or a development release, like ``'1.0b2'``
+    or ``'1.0.dev3'``.
+    '''
+
+    key = parse_version(version)
+    return key[0] == 1 and (key[3] != (3, 0) or key[5] != (1, 0))
+
+
+def sort_versions(versions, reverse=False):
+    '''
+    .. versionadded:: 0.8
+
+    Returns a new list with *versions* sorted from the oldest to the newest (or from the newest
+    to the oldest if *reverse* is True)::
+
+        >>> sort_versions(['1.0.9', '1.0.10', '1.0b1', '0.9'])
+        ['0.9', '1.0b1', '1.0.9', '1.0.10']
+    '''
+
+    return sorted(versions, key=parse_version, reverse=reverse)
+
+
+def latest(versions, prereleases=False):
+    '''
+    .. versionadded:: 0.8
+
+    Returns the newest version in *versions*, or None if it is empty. Pre-releases are
+    considered only if *prereleases* is True, or if there are no final releases.
+    '''
+
+    versions = list(versions)
+    if not prereleases:
+        final = [v for v in versions if not is_prerelease(v)]
+        if final:
+            versions = final
+    if not versions:
+        return None
+    return max(versions, key=parse_version)
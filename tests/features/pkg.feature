@@ -29,6 +29,20 @@ Scenario Outline: Test Egg object
         | zip_safe     | False                          |
         | location     | *dist/pkgtools-0.6.2-py2.7.egg |
 
+Scenario Outline: Test Wheel object
+    Given I set wheel_dist to "pkgtools-0.6.2-py2.py3-none-any.whl" as Wheel
+    When I get wheel_dist.<attr>
+    Then I see <result>
+
+    Examples:
+        | attr         | result                                    |
+        | name         | pkgtools                                  |
+        | version      | 0.6.2                                     |
+        | as_req       | pkgtools==0.6.2                           |
+        | has_metadata | True                                      |
+        | zip_safe     | True                                      |
+        | location     | *dist/pkgtools-0.6.2-py2.py3-none-any.whl |
+
 Scenario Outline: Test Dir object
     Given I set dir_dist to "pkgtools.egg-info" as Dir
     When I get dir_dist.<attr>
@@ -0,0 +1,209 @@
+'''
+Tests for pkgtools.aiopypi, against a stub Json index on localhost.
+'''
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import unittest
+import threading
+import urllib.error
+
+try:
+    import pkgtools.aiopypi as aiopypi
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.aiopypi as aiopypi
+
+
+RELEASES = {
+    'pyg': '0.4',
+    'pkgtools': '0.6.2',
+    'argh': '0.14.0',
+}
+
+
+def _release(name, version):
+    filename = '{0}-{1}.tar.gz'.format(name, version)
+    return {
+        'info': {'name': name, 'version': version},
+        'urls': [{'filename': filename, 'md5_digest': 'd41d8cd98f00b204',
+                  'url': 'http://localhost/packages/' + filename}],
+    }
+
+
+class StubIndex(object):
+    ## A keep-alive HTTP/1.1 server on a raw socket, so that the tests can see every
+    ## connection: /pypi/<name>[/<version>]/json is answered, /slow never is
+
+    def __init__(self):
+        self.accepted = 0
+        self.closed = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._sock = socket.socket()
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(128)
+        self.url = 'http://127.0.0.1:{0}/pypi/{{0}}/json'.format(self._sock.getsockname()[1])
+        self.base = 'http://127.0.0.1:{0}'.format(self._sock.getsockname()[1])
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self._sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.accepted += 1
+            thread = threading.Thread(target=self._handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, conn):
+        data = b''
+        try:
+            while True:
+                while b'\r\n\r\n' not in data:
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        return
+                    data += chunk
+                head, _, data = data.partition(b'\r\n\r\n')
+                path = head.split(b' ')[1].decode('latin-1')
+                with self._lock:
+                    self.requests.append(path)
+                if path == '/slow':
+                    ## Wait until the client gives up and closes the connection
+                    while conn.recv(65536):
+                        pass
+                    return
+                conn.sendall(self._response(path))
+        finally:
+            conn.close()
+            with self._lock:
+                self.closed += 1
+
+    def _response(self, path):
+        parts = path.strip('/').split('/')
+        if len(parts) in (3, 4) and parts[0] == 'pypi' and parts[1] in RELEASES and parts[-1] == 'json':
+            version = parts[2] if len(parts) == 4 else RELEASES[parts[1]]
+            body = json.dumps(_release(parts[1], version)).encode('utf-8')
+            status = '200 OK'
+        else:
+            body = b'Not Found'
+            status = '404 Not Found'
+        head = 'HTTP/1.1 {0}\r\nContent-Type: application/json\r\nContent-Length: {1}\r\n\r\n'
+        return head.format(status, len(body)).encode('latin-1') + body
+
+    def wait_closed(self, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if self.closed == self.accepted:
+                    return True
+            time.sleep(0.01)
+        return False
+
+
+class AsyncPyPIJsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = StubIndex()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.index.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def close(self, client):
+        ## The transports are closed by the loop
+        client.close()
+        self.run_async(asyncio.sleep(0.01))
+
+    def collect(self, agen):
+        async def collect():
+            return [item async for item in agen]
+        return self.run_async(collect())
+
+    def test_retrieve_many(self):
+        pypi = aiopypi.AsyncPyPIJson(self.index.url)
+        errors = []
+        results = self.collect(pypi.retrieve_many(['pyg', 'missing', 'pkgtools'], concurrency=2,
+                                                  onerror=lambda name, e: errors.append((name, e))))
+        self.close(pypi)
+        self.assertEqual(sorted((name, data['info']['version']) for name, data in results),
+                         [('pkgtools', '0.6.2'), ('pyg', '0.4')])
+        self.assertEqual([name for name, e in errors], ['missing'])
+        self.assertIsInstance(errors[0][1], urllib.error.HTTPError)
+        self.assertEqual(errors[0][1].code, 404)
+
+    def test_find_many_versions(self):
+        pypi = aiopypi.AsyncPyPIJson(self.index.url)
+        results = self.collect(pypi.find_many(['pyg', 'argh'], ['0.3', '0.14.0']))
+        self.close(pypi)
+        self.assertEqual(sorted(results), [
+            ('argh', ('0.14.0', 'argh-0.14.0.tar.gz', 'd41d8cd98f00b204',
+                      'http://localhost/packages/argh-0.14.0.tar.gz', '.tar.gz')),
+            ('pyg', ('0.3', 'pyg-0.3.tar.gz', 'd41d8cd98f00b204',
+                     'http://localhost/packages/pyg-0.3.tar.gz', '.tar.gz')),
+        ])
+        self.assertIn('/pypi/pyg/0.3/json', self.index.requests)
+
+    def test_connections_are_reused(self):
+        pypi = aiopypi.AsyncPyPIJson(self.index.url)
+        results = self.collect(pypi.retrieve_many(['pyg'] * 20, concurrency=1))
+        self.close(pypi)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(self.index.accepted, 1)
+        self.assertTrue(self.index.wait_closed())
+
+    def test_stale_connection_is_retried(self):
+        client = aiopypi.AsyncHTTPClient()
+        self.run_async(client.fetch(self.index.url.format('pyg')))
+        ## The server closes the idle connection
+        for reader, writer in client._pools[('http', '127.0.0.1', int(self.index.base.rsplit(':', 1)[1]))]:
+            writer.transport.abort()
+        body = self.run_async(client.fetch(self.index.url.format('pyg')))
+        self.close(client)
+        self.assertEqual(json.loads(body.decode('utf-8'))['info']['name'], 'pyg')
+
+    def test_timeouts_close_the_connections(self):
+        client = aiopypi.AsyncHTTPClient(timeout=0.05)
+        for i in range(10):
+            with self.assertRaises(asyncio.TimeoutError):
+                self.run_async(client.fetch(self.index.base + '/slow'))
+        self.close(client)
+        self.assertEqual(self.index.accepted, 10)
+        self.assertTrue(self.index.wait_closed())
+
+    def test_cancelled_requests_close_the_connections(self):
+        client = aiopypi.AsyncHTTPClient()
+
+        async def cancel():
+            tasks = [asyncio.ensure_future(client.fetch(self.index.base + '/slow')) for i in range(5)]
+            while len(self.index.requests) < 5:
+                await asyncio.sleep(0.01)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.run_async(cancel())
+        self.close(client)
+        self.assertEqual(self.index.accepted, 5)
+        self.assertTrue(self.index.wait_closed())
+
+
+if __name__ == '__main__':
+    unittest.main()
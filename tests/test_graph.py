@@ -0,0 +1,142 @@
+'''
+Tests for pkgtools.graph, on stand-in distributions.
+'''
+
+import os
+import sys
+import unittest
+
+try:
+    import pkgtools.graph as graph
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.graph as graph
+from pkgtools.pkg import Requirement
+
+
+class StandInDist(object):
+    ## Only the attributes used by DependencyGraph
+
+    def __init__(self, name, install=(), extras=None):
+        self.name = name
+        self.requirements = {
+            'install': Requirement.parse_set(install),
+            'extras': dict((e, Requirement.parse_set(r)) for e, r in (extras or {}).items()),
+        }
+
+
+def make_graph(*dists):
+    return graph.DependencyGraph([StandInDist(*d) for d in dists])
+
+
+class DependencyGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = make_graph(
+            ('pyg', ['argh>=0.14', 'pkgtools', 'setuptools']),
+            ('pkgtools', ['setuptools'], {'xmlrpc': ['requests'], 'test:python_version<"3"': ['mock']}),
+            ('argh', []),
+            ('Sphinx', ['Jinja2>=2.3', 'docutils'], {'test': ['nose']}),
+            ('jinja2', ['MarkupSafe']),
+            ('markupsafe', []),
+            ('docutils', []),
+        )
+
+    def test_requires(self):
+        self.assertEqual(self.graph.requires('pyg'), ['argh', 'pkgtools', 'setuptools'])
+        self.assertEqual(self.graph.requires('PkgTools', extras=['xmlrpc']), ['requests', 'setuptools'])
+        self.assertEqual(self.graph.requires('missing'), [])
+
+    def test_required_by(self):
+        self.assertEqual(self.graph.required_by('setuptools'), ['pkgtools', 'pyg'])
+        self.assertEqual(self.graph.required_by('MarkupSafe', transitive=True), ['jinja2', 'sphinx'])
+        ## Extras are not followed
+        self.assertEqual(self.graph.required_by('nose'), [])
+
+    def test_closure(self):
+        self.assertEqual(self.graph.closure('pyg'), ['argh', 'pkgtools', 'setuptools'])
+        self.assertEqual(self.graph.closure('sphinx'), ['docutils', 'jinja2', 'markupsafe'])
+        self.assertEqual(self.graph.closure('Sphinx', extras=['test']), ['docutils', 'jinja2', 'markupsafe', 'nose'])
+        ## Sections with markers belong to their extra
+        self.assertEqual(self.graph.closure('pkgtools', extras=['test']), ['mock', 'setuptools'])
+
+    def test_closure_follows_extras_of_requirements(self):
+        g = make_graph(('app', ['pkgtools[xmlrpc]']), ('pkgtools', [], {'xmlrpc': ['requests']}))
+        self.assertEqual(g.closure('app'), ['pkgtools', 'requests'])
+
+    def test_closure_is_memoized(self):
+        self.graph.closure('pyg')
+        self.assertIn(('pyg', frozenset()), self.graph._closures)
+        closure = self.graph._closures[('pyg', frozenset())]
+        self.graph.closure('pyg')
+        self.assertIs(self.graph._closures[('pyg', frozenset())], closure)
+
+    def test_memoized_closures_are_invalidated(self):
+        self.assertEqual(self.graph.closure('pyg'), ['argh', 'pkgtools', 'setuptools'])
+        self.assertEqual(self.graph.closure('sphinx'), ['docutils', 'jinja2', 'markupsafe'])
+        ## setuptools was missing: the closures which contain it are discarded
+        self.graph.add(StandInDist('setuptools', ['wheel']))
+        self.assertNotIn(('pyg', frozenset()), self.graph._closures)
+        self.assertIn(('sphinx', frozenset()), self.graph._closures)
+        self.assertEqual(self.graph.closure('pyg'), ['argh', 'pkgtools', 'setuptools', 'wheel'])
+        ## A distribution replaced by a new version
+        self.graph.add(StandInDist('argh', ['six']))
+        self.assertEqual(self.graph.closure('pyg'), ['argh', 'pkgtools', 'setuptools', 'six', 'wheel'])
+        self.graph.remove('argh')
+        self.assertEqual(self.graph.closure('pyg'), ['argh', 'pkgtools', 'setuptools', 'wheel'])
+        self.assertEqual(self.graph.required_by('six'), [])
+
+    def test_missing(self):
+        self.assertEqual(self.graph.missing('pyg'), ['setuptools'])
+        self.assertEqual(self.graph.missing('sphinx'), [])
+        self.assertEqual(self.graph.missing('sphinx', extras=['test']), ['nose'])
+        ## Without a name, the requirements of every extra are included
+        self.assertEqual(self.graph.missing(), ['mock', 'nose', 'requests', 'setuptools'])
+
+    def test_topological_order(self):
+        order = self.graph.topological_order()
+        self.assertEqual(sorted(order), sorted(self.graph.dists))
+        for node in order:
+            for dep in self.graph.requires(node):
+                if dep in self.graph:
+                    self.assertLess(order.index(dep), order.index(node), '{0} before {1}'.format(dep, node))
+        ## Ties are broken by name
+        self.assertEqual(order[:3], ['argh', 'docutils', 'markupsafe'])
+
+    def test_cycles(self):
+        self.assertEqual(self.graph.cycles(), [])
+        g = make_graph(
+            ('a', ['b']), ('b', ['c']), ('c', ['a', 'd']),
+            ('d', ['e']), ('e', ['d']),
+            ('f', ['f']),
+            ('g', ['a']),
+            ## Cycles through extras are not install cycles
+            ('h', [], {'test': ['i']}), ('i', ['h']),
+        )
+        self.assertEqual(g.cycles(), [['a', 'b', 'c'], ['d', 'e'], ['f']])
+        order = g.topological_order()
+        ## The distributions in a cycle, and those which depend on them, come last, but a
+        ## distribution which requires itself does not block the order
+        self.assertEqual(order[:3], ['f', 'h', 'i'])
+        self.assertEqual(sorted(order[3:]), ['a', 'b', 'c', 'd', 'e', 'g'])
+
+    def test_deep_chain(self):
+        ## Neither the closures nor the cycles are computed recursively
+        n = 5000
+        g = make_graph(*[('n{0}'.format(i), ['n{0}'.format(i + 1)]) for i in range(n)] + [('n{0}'.format(n), ['n0'])])
+        self.assertEqual(len(g.closure('n0')), n)
+        self.assertNotIn('n0', g.closure('n0'))
+        self.assertEqual(len(g.cycles()[0]), n + 1)
+
+    def test_working_set_and_names(self):
+        class WS(object):
+            packages = {'Foo_Bar': ('/path', StandInDist('Foo_Bar', ['Baz.Qux']))}
+        g = graph.DependencyGraph(WS())
+        self.assertIn('foo-bar', g)
+        self.assertIn('FOO.bar', g)
+        self.assertEqual(len(g), 1)
+        self.assertEqual(g.requires('foo_bar'), ['baz-qux'])
+
+
+if __name__ == '__main__':
+    unittest.main()
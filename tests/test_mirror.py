@@ -0,0 +1,172 @@
+'''
+Tests for pkgtools.mirror, against a stand-in index on localhost which serves the Xml-Rpc
+changelog and the Json API.
+'''
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from xmlrpc.server import SimpleXMLRPCDispatcher
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
+
+try:
+    import pkgtools.mirror as mirror
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.mirror as mirror
+from pkgtools.pypi import HTTPClient, PyPIXmlRpc
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInIndex(object):
+    ## The changelog is a list of (name, version, timestamp, action, serial) events, and
+    ## self.releases maps the (name, version) pairs served by the Json API to their status
+
+    def __init__(self):
+        self.events = []
+        self.releases = {}
+        self.fetched = []
+        dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+        ## Like PyPI, changelog(since) excludes the events logged at *since*
+        dispatcher.register_function(lambda since: [e[:4] for e in self.events if e[2] > since], 'changelog')
+        dispatcher.register_function(lambda: self.events[-1][4] if self.events else 0, 'changelog_last_serial')
+        dispatcher.register_function(lambda serial: [list(e) for e in self.events if e[4] > serial],
+                                     'changelog_since_serial')
+        index = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                ## /pypi/<name>/<version>/json
+                parts = self.path.strip('/').split('/')
+                release = tuple(parts[1:3])
+                index.fetched.append(release)
+                status = index.releases.get(release, 404)
+                if status != 200:
+                    return self._send(status, b'Error', 'text/plain')
+                body = json.dumps({'info': {'name': release[0], 'version': release[1]}, 'urls': []})
+                self._send(200, body.encode('utf-8'), 'application/json')
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers['Content-Length']))
+                self._send(200, dispatcher._marshaled_dispatch(data), 'text/xml')
+
+        self.server = _Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def log(self, name, version, timestamp, action, status=200):
+        self.events.append((name, version, timestamp, action, len(self.events) + 1))
+        if version is not None:
+            self.releases[name, version] = status
+
+
+class MirrorSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = StandInIndex()
+        self.directory = tempfile.mkdtemp()
+        self.store = mirror.MirrorStore(os.path.join(self.directory, 'mirror.db'))
+        self.client = HTTPClient()
+        xmlrpc = PyPIXmlRpc(self.index.url + '/pypi', client=self.client)
+        self.sync = mirror.MirrorSync(self.store, xmlrpc, self.index.url + '/pypi/{0}/json', self.client)
+
+    def tearDown(self):
+        self.client.close()
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def test_first_sync(self):
+        self.index.log('pyg', '0.3', 100, 'new release')
+        self.index.log('pyg', '0.4', 200, 'new release')
+        self.index.log('pyg', '0.4', 201, 'add source file')
+        self.index.log('pkgtools', None, 202, 'create')
+        result = self.sync.sync(150)
+        self.assertEqual(result, {'updated': [('pyg', '0.4')], 'removed': [], 'failed': [], 'serial': 4})
+        self.assertEqual(self.store.get('pyg', '0.4')['info']['version'], '0.4')
+        self.assertEqual(self.store.versions('pyg'), ['0.4'])
+        self.assertEqual(self.store.serial, 4)
+
+    def test_only_new_changes_are_fetched(self):
+        self.index.log('pyg', '0.4', 200, 'new release')
+        self.sync.sync(0)
+        del self.index.fetched[:]
+        self.index.log('argh', '0.14', 300, 'new release')
+        result = self.sync.sync()
+        self.assertEqual(result['updated'], [('argh', '0.14')])
+        self.assertEqual(self.index.fetched, [('argh', '0.14')])
+        self.assertEqual(self.sync.sync()['updated'], [])
+
+    def test_changes_in_the_same_second(self):
+        self.index.log('pyg', '0.4', 200, 'new release')
+        self.sync.sync(0)
+        ## Logged in the same second as the last event seen
+        self.index.log('argh', '0.14', 200, 'new release')
+        self.assertEqual(self.sync.sync()['updated'], [('argh', '0.14')])
+        self.assertEqual(len(self.store), 2)
+
+    def test_removals(self):
+        self.index.log('pyg', '0.3', 100, 'new release')
+        self.index.log('pyg', '0.4', 101, 'new release')
+        self.index.log('argh', '0.14', 102, 'new release')
+        self.sync.sync(0)
+        self.index.log('pyg', '0.3', 200, 'remove release')
+        self.index.log('argh', None, 201, 'remove project')
+        result = self.sync.sync()
+        self.assertEqual(result['removed'], [('argh', None), ('pyg', '0.3')])
+        self.assertEqual(sorted((n, v) for n, v, data in self.store), [('pyg', '0.4')])
+
+    def test_missing_releases_are_dropped(self):
+        self.index.log('pyg', '0.4', 100, 'new release', status=404)
+        result = self.sync.sync(0)
+        self.assertEqual(result['removed'], [('pyg', '0.4')])
+        self.assertEqual(result['failed'], [])
+        self.assertEqual(self.store.pending, [])
+
+    def test_failed_releases_are_retried(self):
+        errors = []
+        self.index.log('pyg', '0.4', 100, 'new release', status=500)
+        result = self.sync.sync(0, onerror=lambda release, e: errors.append(release))
+        self.assertEqual(result['failed'], [('pyg', '0.4')])
+        self.assertEqual(errors, [('pyg', '0.4')])
+        self.assertEqual(self.store.pending, [('pyg', '0.4')])
+        self.index.releases['pyg', '0.4'] = 200
+        result = self.sync.sync()
+        self.assertEqual(result['updated'], [('pyg', '0.4')])
+        self.assertEqual(self.store.pending, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
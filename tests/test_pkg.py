@@ -0,0 +1,499 @@
+'''
+Tests for pkgtools.pkg, on distributions built in a temporary directory.
+'''
+
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+try:
+    import pkgtools.pkg as pkg
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.pkg as pkg
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+
+def pkg_info(name, version, encoding='utf-8', **fields):
+    lines = ['Metadata-Version: 1.1', 'Name: ' + name, 'Version: ' + version]
+    lines.extend('{0}: {1}'.format(k.replace('_', '-'), v) for k, v in sorted(fields.items()))
+    return ('\n'.join(lines) + '\n').encode(encoding)
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def make_egg(self, name, version, files=None, compression=zipfile.ZIP_STORED, info=None):
+        path = self.path('{0}-{1}-py2.7.egg'.format(name, version))
+        with zipfile.ZipFile(path, 'w', compression) as zf:
+            zf.writestr('EGG-INFO/PKG-INFO', info if info is not None else pkg_info(name, version))
+            for fname, data in (files or {}).items():
+                zf.writestr('EGG-INFO/' + fname, data)
+        return path
+
+
+class RequirementTest(unittest.TestCase):
+
+    def test_parse(self):
+        r = pkg.Requirement.parse('foo[bar, baz] >=1.0, <2; python_version < "3"')
+        self.assertEqual((r.name, r.specifier, r.extras, r.markers, r.url),
+                         ('foo', '>=1.0,<2', ('bar', 'baz'), 'python_version < "3"', ''))
+        self.assertEqual(str(r), 'foo[bar,baz]>=1.0,<2; python_version < "3"')
+        r = pkg.Requirement.parse('argh')
+        self.assertEqual((r.name, r.specifier, r.extras, r.markers), ('argh', '', (), ''))
+
+    def test_parenthesized_specifier(self):
+        self.assertEqual(str(pkg.Requirement.parse('foo (>=1.0, <2)')), 'foo>=1.0,<2')
+
+    def test_direct_reference(self):
+        r = pkg.Requirement.parse('foo @ https://example.com/foo-1.0.zip')
+        self.assertEqual((r.name, r.specifier, r.url), ('foo', '', 'https://example.com/foo-1.0.zip'))
+        self.assertEqual(str(r), 'foo @ https://example.com/foo-1.0.zip')
+        r = pkg.Requirement.parse('foo[test]@https://example.com/foo.zip ; python_version >= "3"')
+        self.assertEqual((r.name, r.extras, r.url, r.markers),
+                         ('foo', ('test',), 'https://example.com/foo.zip', 'python_version >= "3"'))
+        ## The normalized form keeps the markers out of the URL
+        self.assertIs(pkg.Requirement.parse(str(r)), r)
+        ## Without whitespace, the semicolon is part of the URL
+        r = pkg.Requirement.parse('foo @ git+https://example.com/foo.git@v1;egg=foo')
+        self.assertEqual((r.url, r.markers), ('git+https://example.com/foo.git@v1;egg=foo', ''))
+
+    def test_normalized_form(self):
+        ## Whitespace, parentheses and the order of the extras do not matter
+        self.assertEqual(str(pkg.Requirement.parse('Foo_Bar [b,a] ( >= 1.0 ) ;extra == "x"')),
+                         'Foo_Bar[a,b]>=1.0; extra == "x"')
+        self.assertEqual(pkg.Requirement.parse('argh >= 0.14'), pkg.Requirement.parse('argh>=0.14'))
+        self.assertNotEqual(pkg.Requirement.parse('argh>=0.14'), pkg.Requirement.parse('argh>=0.15'))
+        self.assertEqual(pkg.normalize_name('Foo_Bar.baz'), 'foo-bar-baz')
+
+    def test_interning(self):
+        a = pkg.Requirement.parse('pyg>=0.4')
+        self.assertIs(pkg.Requirement.parse('pyg>=0.4'), a)
+        self.assertIs(pkg.Requirement.parse('pyg >= 0.4'), a)
+        self.assertIs(pkg.Requirement.parse('pyg (>=0.4)'), a)
+        self.assertIs(pkg.Requirement.parse_set(['pyg>=0.4', 'argh']),
+                      pkg.Requirement.parse_set(['argh', 'pyg>=0.4']))
+        self.assertIn(a, pkg.Requirement.parse_set(['pyg >= 0.4']))
+        self.assertIs(pkg.Requirement._intern_strings(['a', 'b']), pkg.Requirement._intern_strings(['b', 'a']))
+
+    def test_invalid(self):
+        for string in ('', '>=1.0', '[extra]', 'foo[bar'):
+            self.assertRaises(ValueError, pkg.Requirement.parse, string)
+
+    def test_requires_dist_markers(self):
+        requires = pkg._requires_dist([
+            'six (>=1.0)',
+            'pytest; extra == "test"',
+            'enum34; python_version < "3.4"',
+            'mock; python_version < "3" and (extra == "test" or extra == "dev")',
+        ])
+        self.assertEqual(requires['install'], frozenset(['six>=1.0']))
+        self.assertEqual(requires['extras'], {
+            'test': frozenset(['pytest']),
+            ':python_version < "3.4"': frozenset(['enum34']),
+            'test:python_version < "3"': frozenset(['mock']),
+            'dev:python_version < "3"': frozenset(['mock']),
+        })
+        ## Shared by all the distributions
+        self.assertIs(requires['install'], pkg._requires_dist(['six (>=1.0)'])['install'])
+
+
+class EggTest(TempDirTestCase):
+
+    def test_parsed_files_release_their_raw_data(self):
+        path = self.make_egg('pyg', '0.4', {'SOURCES.txt': b'pyg/__init__.py\npyg/core.py\n'})
+        for mmap in (False, True):
+            e = pkg.Egg(path, mmap=mmap)
+            self.assertEqual(e.file_objects, [])
+            self.assertEqual(e._pending, {})
+            self.assertEqual(e.file('SOURCES.txt'), ['pyg/__init__.py', 'pyg/core.py'])
+
+    def test_lazy_mmap_copies_pending_files(self):
+        path = self.make_egg('pyg', '0.4', {'SOURCES.txt': b'pyg/__init__.py\n'})
+        e = pkg.Egg(path, lazy=True, mmap=True)
+        self.assertEqual(e.file_objects, [])
+        self.assertEqual(sorted(e._pending), ['PKG-INFO', 'SOURCES.txt'])
+        self.assertTrue(all(isinstance(data, bytes) for data in e._pending.values()))
+        self.assertEqual((e.name, e.version), ('pyg', '0.4'))
+        self.assertEqual(e.file('SOURCES.txt'), ['pyg/__init__.py'])
+
+    def test_latin1_pkg_info(self):
+        info = pkg_info('pyg', '0.4', 'latin-1', Author=u'Jos\xe9')
+        path = self.make_egg('pyg', '0.4', info=info)
+        for lazy in (False, True):
+            for mmap in (False, True):
+                e = pkg.Egg(path, lazy=lazy, mmap=mmap)
+                self.assertEqual(e.name, 'pyg')
+                self.assertEqual(e.pkg_info['Author'], u'Jos\xe9')
+
+    def test_utf8_pkg_info(self):
+        path = self.make_egg('pyg', '0.4', info=pkg_info('pyg', '0.4', Author=u'Jos\xe9'))
+        self.assertEqual(pkg.Egg(path).pkg_info['Author'], u'Jos\xe9')
+
+
+class MetadataCacheTest(TempDirTestCase):
+
+    def setUp(self):
+        super(MetadataCacheTest, self).setUp()
+        self.egg = self.make_egg('pyg', '0.4', {'requires.txt': b'argh>=0.14\n'})
+        self.cache = pkg.MetadataCache(self.path('cache'))
+
+    def test_hit(self):
+        pkg.Egg(self.egg, cache=self.cache)
+        self.assertIsNotNone(self.cache.get(self.egg))
+        e = pkg.Egg(self.egg, cache=self.cache)
+        self.assertEqual(e.file_objects, [])
+        self.assertEqual(e.file('requires.txt')['install'], frozenset(['argh>=0.14']))
+
+    def test_corrupt_entry(self):
+        pkg.Egg(self.egg, cache=self.cache)
+        with self.cache._db:
+            self.cache._db.execute('UPDATE metadata SET data = ?', (pkg.sqlite3.Binary(b'garbage'),))
+        self.assertEqual(pkg.Egg(self.egg, cache=self.cache).name, 'pyg')
+        ## The entry was stored again
+        self.assertEqual(self.cache.get(self.egg)['metadata']['PKG-INFO']['Name'], 'pyg')
+
+    def test_read_only_database(self):
+        pkg.Egg(self.egg, cache=self.cache)
+        self.cache.invalidate()
+        db = pkg.sqlite3.connect('file:{0}?mode=ro'.format(self.path('cache', 'metadata.db')), uri=True)
+        self.cache._db = db
+        try:
+            self.assertEqual(pkg.Egg(self.egg, cache=self.cache).name, 'pyg')
+        finally:
+            db.close()
+
+    def test_pickled_cache_is_opened_lazily(self):
+        pkg.Egg(self.egg, cache=self.cache)
+        cache = pkg.pickle.loads(pkg.pickle.dumps(self.cache))
+        self.assertIsNone(cache._db)
+        self.assertIsNone(cache._size)
+        self.assertEqual(pkg.Egg(self.egg, cache=cache).name, 'pyg')
+        self.assertIsNone(cache._size)
+
+    def test_size_and_eviction(self):
+        cache = pkg.MetadataCache(self.path('cache'), max_size=1)
+        pkg.Egg(self.egg, cache=cache)
+        ## The entry alone is larger than max_size
+        self.assertEqual(cache._size, 0)
+        self.assertIsNone(cache.get(self.egg))
+
+
+class MetadataLRUTest(TempDirTestCase):
+
+    def setUp(self):
+        super(MetadataLRUTest, self).setUp()
+        self.lru = pkg.MetadataLRU(maxsize=2)
+
+    def make_egg_info(self, name, version, mtime=None):
+        path = self.path('{0}.egg-info'.format(name))
+        if not os.path.isdir(path):
+            os.mkdir(path)
+        with open(os.path.join(path, 'PKG-INFO'), 'wb') as fobj:
+            fobj.write(pkg_info(name, version))
+        if mtime is not None:
+            os.utime(os.path.join(path, 'PKG-INFO'), (mtime, mtime))
+        return path
+
+    def test_hits_and_misses(self):
+        egg = self.make_egg('pyg', '0.4')
+        d = self.lru(egg)
+        self.assertEqual(d.version, '0.4')
+        self.assertIs(self.lru(egg), d)
+        ## Relative paths share the entry of the absolute path
+        self.assertIs(self.lru(os.path.relpath(egg)), d)
+        self.assertEqual(self.lru.cache_info(), pkg.MetadataLRU.CacheInfo(2, 1, 2, 1))
+        ## lazy is part of the key
+        self.assertIsNot(self.lru(egg, lazy=True), d)
+        self.assertEqual(self.lru.cache_info(), pkg.MetadataLRU.CacheInfo(2, 2, 2, 2))
+        self.lru.cache_clear()
+        self.assertEqual(self.lru.cache_info(), pkg.MetadataLRU.CacheInfo(0, 0, 2, 0))
+
+    def test_changed_file(self):
+        egg = self.make_egg('pyg', '0.4')
+        self.assertEqual(self.lru(egg).version, '0.4')
+        os.remove(egg)
+        self.make_egg('pyg', '0.4', info=pkg_info('pyg', '0.5'))
+        os.utime(egg, (1, 1))
+        self.assertEqual(self.lru(egg).version, '0.5')
+        self.assertEqual(self.lru.cache_info().misses, 2)
+
+    def test_metadata_rewritten_in_place(self):
+        ## The directory's mtime does not change, the stat of PKG-INFO does
+        path = self.make_egg_info('argh', '0.14.0', mtime=1)
+        d = self.lru(path)
+        self.assertIsInstance(d, pkg.Dir)
+        mtime = os.stat(path).st_mtime
+        self.make_egg_info('argh', '0.14.1', mtime=2)
+        self.assertEqual(os.stat(path).st_mtime, mtime)
+        self.assertEqual(self.lru(path).version, '0.14.1')
+        self.assertEqual(self.lru.cache_info().hits, 0)
+
+    def test_invalidate(self):
+        egg = self.make_egg('pyg', '0.4')
+        path = self.make_egg_info('argh', '0.14.0')
+        self.lru(egg)
+        self.lru(path)
+        self.lru.invalidate(self.path('other'))
+        self.assertEqual(self.lru.cache_info().currsize, 2)
+        self.lru.invalidate(os.path.relpath(egg))
+        self.assertEqual(self.lru.cache_info().currsize, 1)
+        ## The entries inside a directory
+        self.lru.invalidate(self.directory)
+        self.assertEqual(self.lru.cache_info().currsize, 0)
+
+    def test_eviction(self):
+        eggs = [self.make_egg('pkg{0}'.format(i), '1.0') for i in range(3)]
+        first = self.lru(eggs[0])
+        self.lru(eggs[1])
+        ## The least recently used entry is eggs[1]
+        self.lru(eggs[0])
+        self.lru(eggs[2])
+        self.assertEqual(self.lru.cache_info().currsize, 2)
+        self.assertEqual([key[1] for key in self.lru._entries], [eggs[0], eggs[2]])
+        self.assertIs(self.lru(eggs[0]), first)
+        self.assertEqual(self.lru.cache_info().misses, 3)
+
+
+@unittest.skipIf(futures is None, 'concurrent.futures is not available')
+class LoadManyTest(TempDirTestCase):
+
+    def setUp(self):
+        super(LoadManyTest, self).setUp()
+        self.eggs = [self.make_egg('pkg{0}'.format(i), '1.{0}'.format(i)) for i in range(10)]
+        self.readme = self.path('README')
+        with open(self.readme, 'w') as fobj:
+            fobj.write('Not a distribution\n')
+        self.missing = self.path('missing-1.0-py2.7.egg')
+
+    def load(self, paths, **kwargs):
+        errors = []
+        results = list(pkg.load_many(paths, onerror=lambda path, exc: errors.append((path, exc)), **kwargs))
+        return results, errors
+
+    def check(self, executor):
+        results, errors = self.load(self.eggs + [self.readme, self.missing], workers=2, executor=executor)
+        ## Every path is yielded once, with its own distribution
+        self.assertEqual(sorted(path for path, d in results), sorted(self.eggs))
+        for path, d in results:
+            self.assertIsInstance(d, pkg.Egg)
+            self.assertEqual(d.as_req, '{0}==1.{1}'.format(d.name, d.name[3:]))
+            self.assertEqual(d.location, path)
+        ## The paths which cannot be loaded are reported with their exception
+        errors = dict(errors)
+        self.assertEqual(sorted(errors), sorted([self.readme, self.missing]))
+        self.assertIsInstance(errors[self.readme], TypeError)
+        self.assertIsInstance(errors[self.missing], EnvironmentError)
+
+    def test_threads(self):
+        self.check('thread')
+
+    def test_processes(self):
+        self.check('process')
+
+    def test_paths_are_consumed_lazily(self):
+        consumed = []
+        def paths():
+            for path in self.eggs:
+                consumed.append(path)
+                yield path
+        results = pkg.load_many(paths(), workers=1, executor='thread')
+        next(results)
+        self.assertEqual(len(consumed), 4)
+        self.assertEqual(len(list(results)), len(self.eggs) - 1)
+
+    def test_errors_are_ignored_by_default(self):
+        results = list(pkg.load_many([self.readme, self.eggs[0]], executor='thread'))
+        self.assertEqual([path for path, d in results], [self.eggs[0]])
+
+    def test_invalid_executor(self):
+        self.assertRaises(ValueError, list, pkg.load_many(self.eggs, executor='greenlet'))
+
+
+class WorkingSetTestCase(TempDirTestCase):
+
+    def setUp(self):
+        super(WorkingSetTestCase, self).setUp()
+        self.site = self.path('site-packages')
+        os.mkdir(self.site)
+        self.add_egg_info('pyg', '0.4')
+        self.add_dist_info('argh', '0.14.0')
+
+    def write(self, path, data):
+        with open(path, 'wb') as fobj:
+            fobj.write(data)
+
+    def touch_site(self):
+        ## Make sure that the change is seen even with a coarse mtime resolution
+        mtime = os.stat(self.site).st_mtime + 10
+        os.utime(self.site, (mtime, mtime))
+
+    def add_egg_info(self, name, version):
+        path = os.path.join(self.site, '{0}-{1}.egg-info'.format(name, version))
+        os.mkdir(path)
+        self.write(os.path.join(path, 'PKG-INFO'), pkg_info(name, version))
+        self.write(os.path.join(path, 'top_level.txt'), name.encode('ascii') + b'\n')
+        self.write(os.path.join(path, 'SOURCES.txt'), b'\n'.join(
+            '{0}/module{1}.py'.format(name, i).encode('ascii') for i in range(1000)))
+        os.mkdir(os.path.join(self.site, name))
+        return path
+
+    def add_dist_info(self, name, version):
+        path = os.path.join(self.site, '{0}-{1}.dist-info'.format(name, version))
+        os.mkdir(path)
+        self.write(os.path.join(path, 'METADATA'), pkg_info(name, version, Requires_Dist='six (>=1.0)'))
+        self.write(os.path.join(path, 'entry_points.txt'), '[console_scripts]\n{0} = {0}:main\n'.format(name).encode('ascii'))
+        self.write(os.path.join(path, 'RECORD'), '{0}.py,sha256=abc,10\n'.format(name).encode('ascii'))
+        return path
+
+    def versions(self, ws):
+        return dict((name, item[1].version) for name, item in ws.packages.items())
+
+
+class WorkingSetRefreshTest(WorkingSetTestCase):
+
+    def setUp(self):
+        super(WorkingSetRefreshTest, self).setUp()
+        self.ws = pkg.WorkingSet([self.site], fast=True)
+
+    def test_nothing_changed(self):
+        dists = dict((name, item[1]) for name, item in self.ws.packages.items())
+        self.assertEqual(self.ws.refresh(), {'added': [], 'removed': [], 'upgraded': []})
+        ## The distributions are not loaded again
+        self.assertTrue(all(self.ws.packages[name][1] is dist for name, dist in dists.items()))
+
+    def test_added(self):
+        self.add_egg_info('pkgtools', '0.8')
+        self.touch_site()
+        self.assertEqual(self.ws.refresh(), {'added': ['pkgtools'], 'removed': [], 'upgraded': []})
+        self.assertEqual(self.ws.by_module('pkgtools')[1].version, '0.8')
+
+    def test_removed(self):
+        shutil.rmtree(os.path.join(self.site, 'argh-0.14.0.dist-info'))
+        self.touch_site()
+        self.assertEqual(self.ws.refresh(), {'added': [], 'removed': ['argh'], 'upgraded': []})
+        self.assertIsNone(self.ws.by_entry_point('console_scripts', 'argh'))
+
+    def test_upgraded(self):
+        shutil.rmtree(os.path.join(self.site, 'argh-0.14.0.dist-info'))
+        self.add_dist_info('argh', '0.15.0')
+        self.touch_site()
+        self.assertEqual(self.ws.refresh(), {'added': [], 'removed': [], 'upgraded': ['argh']})
+        self.assertEqual(self.ws.by_name('argh')[1].version, '0.15.0')
+
+    def test_in_place_rewrite(self):
+        ## Neither the entry's nor the metadata directory's mtime changes
+        pyg = os.path.join(self.site, 'pyg-0.4.egg-info')
+        stats = [os.stat(path) for path in (self.site, pyg)]
+        self.write(os.path.join(pyg, 'PKG-INFO'), pkg_info('pyg', '0.5', Summary='A longer file'))
+        for path, st in zip((self.site, pyg), stats):
+            os.utime(path, (st.st_atime, st.st_mtime))
+        self.assertEqual(self.ws.refresh(), {'added': [], 'removed': [], 'upgraded': ['pyg']})
+        self.assertEqual(self.ws.packages['pyg'][1].version, '0.5')
+
+
+class WorkingSetSnapshotTest(WorkingSetTestCase):
+
+    def setUp(self):
+        super(WorkingSetSnapshotTest, self).setUp()
+        self.snapshot = self.path('ws.snapshot')
+        self.messages = []
+
+    def load(self, path=None):
+        del self.messages[:]
+        return pkg.WorkingSet.load(path or self.snapshot, [self.site], debug=self.messages.append, fast=True)
+
+    def test_round_trip(self):
+        ws = pkg.WorkingSet([self.site], fast=True)
+        ws.save(self.snapshot)
+        loaded = self.load()
+        self.assertEqual(self.messages, [])
+        self.assertEqual(self.versions(loaded), {'pyg': '0.4', 'argh': '0.14.0'})
+        self.assertEqual(loaded.by_name('pyg')[0], os.path.join(self.site, 'pyg'))
+        self.assertEqual(loaded.by_module('pyg.core')[1].name, 'pyg')
+        self.assertEqual(loaded.by_entry_point('console_scripts', 'argh')[1].name, 'argh')
+        argh = loaded.packages['argh'][1]
+        self.assertEqual(argh.requires['install'], frozenset(['six>=1.0']))
+        self.assertEqual(argh.file('RECORD'), [('argh.py', 'sha256=abc', '10')])
+        pyg = loaded.packages['pyg'][1]
+        self.assertEqual(sorted(pyg.files), ['PKG-INFO', 'SOURCES.txt', 'top_level.txt'])
+        self.assertEqual(len(pyg.file('SOURCES.txt')), 1000)
+
+    def test_snapshot_is_compact(self):
+        ws = pkg.WorkingSet([self.site], fast=True)
+        for name, (path, dist) in ws.packages.items():
+            ## Even the parsed file lists are left out
+            dist.files and dist.file('SOURCES.txt' if name == 'pyg' else 'RECORD')
+        ws.save(self.snapshot)
+        with open(self.snapshot, 'rb') as fobj:
+            data = fobj.read()
+        self.assertNotIn(b'module999', data)
+        self.assertNotIn(b'sha256=abc', data)
+        self.assertLess(len(data), 4096)
+
+    def test_added_dist(self):
+        pkg.WorkingSet([self.site], fast=True).save(self.snapshot)
+        self.add_egg_info('pkgtools', '0.8')
+        self.touch_site()
+        loaded = self.load()
+        self.assertEqual(len(self.messages), 1)
+        self.assertIn('stale', self.messages[0])
+        self.assertEqual(self.versions(loaded), {'pyg': '0.4', 'argh': '0.14.0', 'pkgtools': '0.8'})
+
+    def test_removed_dist(self):
+        pkg.WorkingSet([self.site], fast=True).save(self.snapshot)
+        shutil.rmtree(os.path.join(self.site, 'argh-0.14.0.dist-info'))
+        self.touch_site()
+        self.assertEqual(self.versions(self.load()), {'pyg': '0.4'})
+        self.assertIn('stale', self.messages[0])
+
+    def test_in_place_rewrite(self):
+        pkg.WorkingSet([self.site], fast=True).save(self.snapshot)
+        st = os.stat(self.site)
+        path = os.path.join(self.site, 'pyg-0.4.egg-info', 'PKG-INFO')
+        self.write(path, pkg_info('pyg', '0.5', Summary='A longer file'))
+        os.utime(self.site, (st.st_atime, st.st_mtime))
+        self.assertEqual(self.load().packages['pyg'][1].version, '0.5')
+        self.assertIn('stale', self.messages[0])
+
+    def test_snapshot_inside_a_scanned_directory(self):
+        ## Writing the snapshot changes the directory's mtime, but not its distributions
+        snapshot = os.path.join(self.site, 'ws.snapshot')
+        pkg.WorkingSet([self.site], fast=True).save(snapshot)
+        loaded = self.load(snapshot)
+        self.assertEqual(self.messages, [])
+        loaded.save(snapshot)
+        self.assertEqual(self.versions(self.load(snapshot)), {'pyg': '0.4', 'argh': '0.14.0'})
+        self.assertEqual(self.messages, [])
+
+    def test_unreadable_snapshot(self):
+        self.write(self.snapshot, b'garbage')
+        self.assertEqual(self.versions(self.load()), {'pyg': '0.4', 'argh': '0.14.0'})
+        self.assertIn('Cannot load the snapshot', self.messages[0])
+
+    def test_other_arguments(self):
+        pkg.WorkingSet([self.site], fast=True).save(self.snapshot)
+        del self.messages[:]
+        ws = pkg.WorkingSet.load(self.snapshot, [self.site, self.directory], debug=self.messages.append,
+                                 fast=True)
+        self.assertIn('built with other arguments', self.messages[0])
+        self.assertEqual(self.versions(ws), {'pyg': '0.4', 'argh': '0.14.0'})
+
+
+if __name__ == '__main__':
+    unittest.main()
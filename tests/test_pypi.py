@@ -0,0 +1,291 @@
+'''
+Tests for pkgtools.pypi.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+import threading
+
+try:
+    import pkgtools.pypi as pypi
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.pypi as pypi
+from pkgtools.pkg import MetadataCache
+
+try:
+    from xmlrpc.server import SimpleXMLRPCServer
+except ImportError:
+    from SimpleXMLRPCServer import SimpleXMLRPCServer
+
+xmlrpclib = pypi.xmlrpclib
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def body(self, name, size=0):
+        return json.dumps({'info': {'name': name}, 'padding': 'x' * size})
+
+    def test_set_and_get(self):
+        cache = pypi.ResponseCache(self.directory)
+        self.assertEqual(cache.set('http://i/pyg', self.body('pyg'), etag='"1"')['info']['name'], 'pyg')
+        entry = pypi.ResponseCache(self.directory).get('http://i/pyg')
+        self.assertEqual(entry['data']['info']['name'], 'pyg')
+        self.assertEqual(entry['etag'], '"1"')
+        self.assertIsNone(cache.get('http://i/missing'))
+
+    def test_eviction(self):
+        cache = pypi.ResponseCache(self.directory, max_size=2500)
+        for i in range(5):
+            cache.set('http://i/{0}'.format(i), self.body(str(i), 1000))
+            path = cache._path('http://i/{0}'.format(i))
+            os.utime(path, (i, i))
+        self.assertLessEqual(cache._size, 2500)
+        self.assertIsNone(cache.get('http://i/0'))
+        self.assertIsNotNone(cache.get('http://i/4'))
+
+    def test_shared_directory(self):
+        ## The files of other caches are neither counted, evicted nor removed
+        metadata = MetadataCache(self.directory)
+        metadata.set(__file__, None, {'files': []})
+        os.mkdir(os.path.join(self.directory, 'subdir'))
+        size = os.path.getsize(os.path.join(self.directory, 'metadata.db'))
+        cache = pypi.ResponseCache(self.directory, max_size=size // 2 + 2000)
+        self.assertEqual(cache._size, 0)
+        for i in range(5):
+            cache.set('http://i/{0}'.format(i), self.body(str(i), 1000))
+        cache.invalidate()
+        self.assertEqual(cache._size, 0)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['metadata.db', 'subdir'])
+        metadata.set(__file__, None, {'files': []})
+        self.assertEqual(metadata.get(__file__), {'files': []})
+
+
+class StubServer(object):
+    ## A keep-alive HTTP/1.1 server on a raw socket. *policy* receives the method, the path
+    ## and the index of the request on its connection, and returns what to do: 'answer',
+    ## 'answer-close' (answer, then close the connection), 'close' (without answering),
+    ## 'reset' (close with a RST) or 'hang'
+
+    def __init__(self, policy=None):
+        self.policy = policy or (lambda method, path, index: 'answer')
+        self.accepted = 0
+        self.closed = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._sock = socket.socket()
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(16)
+        self.url = 'http://127.0.0.1:{0}'.format(self._sock.getsockname()[1])
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self._sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except (OSError, socket.error):
+                return
+            with self._lock:
+                self.accepted += 1
+            thread = threading.Thread(target=self._handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, conn):
+        data = b''
+        index = 0
+        try:
+            while True:
+                while b'\r\n\r\n' not in data:
+                    chunk = conn.recv(65536)
+                    if not chunk:
+                        return
+                    data += chunk
+                head, _, data = data.partition(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                method, path = lines[0].split(' ')[:2]
+                for line in lines[1:]:
+                    if line.lower().startswith('content-length:'):
+                        length = int(line.split(':')[1])
+                        while len(data) < length:
+                            data += conn.recv(65536)
+                        data = data[length:]
+                with self._lock:
+                    self.requests.append((method, path))
+                action = self.policy(method, path, index)
+                index += 1
+                if action == 'close':
+                    return
+                if action == 'reset':
+                    conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                    return
+                if action == 'hang':
+                    while conn.recv(65536):
+                        pass
+                    return
+                body = path.encode('latin-1')
+                conn.sendall('HTTP/1.1 200 OK\r\nContent-Length: {0}\r\n\r\n'.format(len(body))
+                             .encode('latin-1') + body)
+                if action == 'answer-close':
+                    return
+        except (OSError, socket.error):
+            pass
+        finally:
+            conn.close()
+            with self._lock:
+                self.closed += 1
+
+    def wait_closed(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if self.closed >= count:
+                    return True
+            time.sleep(0.01)
+        return False
+
+
+class HTTPClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = pypi.HTTPClient()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def start(self, policy=None):
+        self.server = StubServer(policy)
+        return self.server.url
+
+    def test_connections_are_reused(self):
+        url = self.start()
+        for i in range(5):
+            self.assertEqual(self.client.open(url + '/pyg').read(), b'/pyg')
+        self.assertEqual(self.server.accepted, 1)
+
+    def test_idle_connection_closed_by_server(self):
+        ## The idle connection is not used at all, so even a POST can be sent
+        url = self.start(lambda method, path, index: 'answer-close')
+        self.client.open(url + '/first')
+        self.assertTrue(self.server.wait_closed(1))
+        self.assertEqual(self.client.open(url + '/RPC2', b'<methodCall/>').read(), b'/RPC2')
+        self.assertEqual(self.server.requests, [('GET', '/first'), ('POST', '/RPC2')])
+        self.assertEqual(self.server.accepted, 2)
+
+    def test_stale_connection_is_retried(self):
+        ## The server reads the second request of a connection, then closes it without answering
+        for action in ('close', 'reset'):
+            url = self.start(lambda method, path, index: 'answer' if index == 0 else action)
+            self.client.open(url + '/first')
+            self.assertEqual(self.client.open(url + '/pyg').read(), b'/pyg')
+            self.assertEqual(self.server.requests, [('GET', '/first'), ('GET', '/pyg'), ('GET', '/pyg')])
+            self.assertEqual(self.server.accepted, 2)
+            self.client.close()
+            self.server.close()
+
+    def test_post_is_not_retried(self):
+        for action in ('close', 'reset'):
+            url = self.start(lambda method, path, index: 'answer' if index == 0 else action)
+            self.client.open(url + '/first')
+            self.assertRaises((pypi.httplib.HTTPException, socket.error),
+                              self.client.request, url + '/RPC2', b'<methodCall/>')
+            self.assertEqual(self.server.requests, [('GET', '/first'), ('POST', '/RPC2')])
+            self.assertEqual(self.server.accepted, 1)
+            self.client.close()
+            self.server.close()
+
+    def test_timeouts_are_not_retried(self):
+        url = self.start(lambda method, path, index: 'hang' if path == '/slow' else 'answer')
+        self.client.open(url + '/first')
+        self.assertRaises(socket.timeout, self.client.request, url + '/slow', timeout=0.1)
+        self.assertEqual(self.server.requests, [('GET', '/first'), ('GET', '/slow')])
+        self.assertEqual(self.server.accepted, 1)
+        ## The connection was closed, not returned to the pool
+        self.assertTrue(self.server.wait_closed(1))
+        self.assertEqual(self.client.open(url + '/pyg').read(), b'/pyg')
+
+
+class StreamingXmlRpcTest(unittest.TestCase):
+
+    PACKAGES = ['package{0}'.format(i) for i in range(2000)]
+    CHANGES = [['pyg', '0.4', 200, 'new release', 1], ['argh', None, 201, 'create', 2]]
+
+    def setUp(self):
+        self.server = SimpleXMLRPCServer(('127.0.0.1', 0), logRequests=False, allow_none=True)
+        self.server.register_function(lambda: self.PACKAGES, 'list_packages')
+        self.server.register_function(lambda since: [c[:4] for c in self.CHANGES if c[2] > since], 'changelog')
+        self.server.register_function(lambda serial: 'not an array', 'changelog_since_serial')
+        self.url = 'http://127.0.0.1:{0}/RPC2'.format(self.server.server_address[1])
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        self.client = pypi.HTTPClient()
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def clients(self):
+        ## Through urllib and through an HTTPClient
+        return [pypi.PyPIXmlRpc(self.url), pypi.PyPIXmlRpc(self.url, client=self.client)]
+
+    def test_items_are_parsed_incrementally(self):
+        body = xmlrpclib.dumps((self.PACKAGES[:3],), methodresponse=True).encode('utf-8')
+        target = pypi._StreamingUnmarshaller()
+        parser = xmlrpclib.ExpatParser(target)
+        seen = []
+        for i in range(len(body)):
+            parser.feed(body[i:i + 1])
+            while target.items:
+                seen.append((target.items.popleft(), i))
+        parser.close()
+        target.close()
+        self.assertEqual([item for item, i in seen], self.PACKAGES[:3])
+        ## Every item is available as soon as its value is complete
+        self.assertTrue(all(i < body.index(b'</array>') for item, i in seen))
+        self.assertLess(seen[0][1], seen[1][1])
+        self.assertTrue(target.array)
+
+    def test_iter_packages(self):
+        for client in self.clients():
+            self.assertEqual(list(client.iter_packages()), self.PACKAGES)
+
+    def test_nested_arrays(self):
+        for client in self.clients():
+            self.assertEqual(list(client.iter_changelog(0)), [tuple(c[:4]) for c in self.CHANGES])
+            self.assertEqual(list(client.iter_changelog(200)), [tuple(self.CHANGES[1][:4])])
+            self.assertEqual(list(client.iter_changelog(1000)), [])
+
+    def test_fault(self):
+        for client in self.clients():
+            with self.assertRaises(xmlrpclib.Fault):
+                list(client._stream('no_such_method', ()))
+
+    def test_not_an_array(self):
+        for client in self.clients():
+            with self.assertRaises(xmlrpclib.ResponseError):
+                list(client.iter_changelog_since_serial(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
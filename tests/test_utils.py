@@ -0,0 +1,158 @@
+'''
+Tests for pkgtools.utils: the memory-mapped zip reader is checked against archives written
+by the zipfile module.
+'''
+
+import io
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+try:
+    import pkgtools.utils as utils
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.utils as utils
+
+
+MEMBERS = [
+    ('EGG-INFO/PKG-INFO', b'Metadata-Version: 1.1\nName: pyg\nVersion: 0.4\n'),
+    ('EGG-INFO/SOURCES.txt', b'\n'.join(b'pyg/module' + str(i).encode('ascii') + b'.py' for i in range(500))),
+    (u'EGG-INFO/n\xe4me.txt', b'non-ascii name'),
+]
+
+
+class _Unseekable(io.RawIOBase):
+    ## zipfile writes data descriptors after the members when the output is not seekable
+
+    def __init__(self, fobj):
+        self.fobj = fobj
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.fobj.write(data)
+
+
+class MappedZipFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make(self, compression=zipfile.ZIP_STORED, prefix=b'', unseekable=False, members=MEMBERS):
+        path = os.path.join(self.directory, 'archive.zip')
+        with open(path, 'wb') as fobj:
+            fobj.write(prefix)
+            with zipfile.ZipFile(_Unseekable(fobj) if unseekable else fobj, 'w', compression) as zf:
+                for name, data in members:
+                    zf.writestr(name, data)
+        return path
+
+    def check(self, path):
+        ## Every member is read like zipfile reads it
+        mz = utils.MappedZipFile(path)
+        try:
+            with zipfile.ZipFile(path) as zf:
+                self.assertEqual(mz.namelist(), zf.namelist())
+                for info in mz.infolist():
+                    data = mz.read(info)
+                    self.assertEqual(bytes(data), zf.read(info.filename))
+                    if isinstance(data, memoryview):
+                        data.release()
+                self.assertEqual(bytes(mz.read('EGG-INFO/PKG-INFO')), MEMBERS[0][1])
+        finally:
+            mz.close()
+        return mz
+
+    def test_stored(self):
+        path = self.make()
+        mz = utils.MappedZipFile(path)
+        data = mz.read('EGG-INFO/SOURCES.txt')
+        ## Stored members are not copied
+        self.assertIsInstance(data, memoryview)
+        data.release()
+        mz.close()
+        self.check(path)
+
+    def test_deflated(self):
+        self.check(self.make(zipfile.ZIP_DEFLATED))
+
+    def test_data_descriptors(self):
+        path = self.make(zipfile.ZIP_DEFLATED, unseekable=True)
+        with zipfile.ZipFile(path) as zf:
+            self.assertTrue(all(info.flag_bits & 0x8 for info in zf.infolist()))
+        self.check(path)
+
+    def test_prepended_data(self):
+        self.check(self.make(zipfile.ZIP_DEFLATED, prefix=b'#!/bin/sh\nexec python "$0"\n' * 10))
+
+    def test_zip_files(self):
+        mz = utils.MappedZipFile(self.make())
+        files = utils.zip_files(mz, 'EGG-INFO', ['PKG-INFO'])
+        self.assertEqual([(bytes(data), name) for data, name in files], [(MEMBERS[0][1], 'PKG-INFO')])
+        del files
+        mz.close()
+
+    def test_bad_crc(self):
+        path = self.make(zipfile.ZIP_DEFLATED, members=MEMBERS[:1])
+        with open(path, 'r+b') as fobj:
+            data = fobj.read()
+            ## The CRC-32 field of the central directory entry
+            pos = data.rfind(b'PK\x01\x02') + 16
+            fobj.seek(pos)
+            fobj.write(b'\0\0\0\0')
+        mz = utils.MappedZipFile(path)
+        self.assertRaises(zipfile.BadZipfile, mz.read, MEMBERS[0][0])
+        mz.close()
+
+    def test_zip64_is_rejected(self):
+        limit = zipfile.ZIP_FILECOUNT_LIMIT
+        ## zipfile writes the ZIP64 end records when there are more members than this
+        zipfile.ZIP_FILECOUNT_LIMIT = 1
+        try:
+            path = self.make()
+        finally:
+            zipfile.ZIP_FILECOUNT_LIMIT = limit
+        self.assertRaises(zipfile.BadZipfile, utils.MappedZipFile, path)
+        z = utils.open_zip(path, use_mmap=True)
+        self.assertIsInstance(z, zipfile.ZipFile)
+        self.assertEqual(z.read('EGG-INFO/PKG-INFO'), MEMBERS[0][1])
+        z.close()
+
+    def test_not_a_zip_file(self):
+        path = os.path.join(self.directory, 'empty.zip')
+        open(path, 'wb').close()
+        self.assertRaises(zipfile.BadZipfile, utils.MappedZipFile, path)
+        with open(path, 'wb') as fobj:
+            fobj.write(b'not a zip file')
+        self.assertRaises(zipfile.BadZipfile, utils.MappedZipFile, path)
+        self.assertRaises(zipfile.BadZipfile, utils.open_zip, path, True)
+
+    def test_other_compressions_fall_back_to_zipfile(self):
+        try:
+            import bz2
+        except ImportError:
+            self.skipTest('bz2 is not available')
+        path = self.make(zipfile.ZIP_BZIP2)
+        mz = self.check(path)
+        self.assertIsNotNone(mz._zipfile)
+
+    def test_open_zip(self):
+        path = self.make()
+        z = utils.open_zip(path, use_mmap=True)
+        self.assertIsInstance(z, utils.MappedZipFile)
+        z.close()
+        z = utils.open_zip(path)
+        self.assertIsInstance(z, zipfile.ZipFile)
+        z.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+'''
+Tests for pkgtools.version: the ordering rules of PEP 440 and of the legacy versions.
+'''
+
+import os
+import sys
+import unittest
+
+try:
+    import pkgtools.version as version
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import pkgtools.version as version
+
+
+## The example of PEP 440, from the oldest to the newest
+PEP440_ORDER = [
+    '1.0.dev456',
+    '1.0a1',
+    '1.0a2.dev456',
+    '1.0a12.dev456',
+    '1.0a12',
+    '1.0b1.dev456',
+    '1.0b2',
+    '1.0b2.post345.dev456',
+    '1.0b2.post345',
+    '1.0rc1.dev456',
+    '1.0rc1',
+    '1.0',
+    '1.0+abc.5',
+    '1.0+abc.7',
+    '1.0+5',
+    '1.0.post456.dev34',
+    '1.0.post456',
+    '1.1.dev1',
+]
+
+
+class ParseVersionTest(unittest.TestCase):
+
+    def assertOrdered(self, versions):
+        for older, newer in zip(versions, versions[1:]):
+            self.assertLess(version.parse_version(older), version.parse_version(newer),
+                            '{0} < {1}'.format(older, newer))
+
+    def assertSame(self, *versions):
+        keys = set(version.parse_version(v) for v in versions)
+        self.assertEqual(len(keys), 1, versions)
+
+    def test_pep440_order(self):
+        self.assertOrdered(PEP440_ORDER)
+        self.assertEqual(version.sort_versions(reversed(PEP440_ORDER)), PEP440_ORDER)
+
+    def test_release_segments(self):
+        self.assertOrdered(['0.9', '1.0', '1.0.1', '1.0.9', '1.0.10', '1.1', '2', '10.0'])
+        self.assertSame('1', '1.0', '1.0.0')
+
+    def test_dev_releases(self):
+        self.assertOrdered(['1.0.dev1', '1.0.dev2', '1.0.dev10', '1.0a1.dev1', '1.0a1', '1.0'])
+        self.assertSame('1.0.dev', '1.0.dev0', '1.0-dev0')
+
+    def test_pre_releases(self):
+        self.assertOrdered(['1.0a1', '1.0a2', '1.0b1', '1.0c1', '1.0rc2', '1.0'])
+        self.assertSame('1.0a1', '1.0alpha1', '1.0-a.1', '1.0A1')
+        self.assertSame('1.0b1', '1.0beta1')
+        self.assertSame('1.0rc1', '1.0c1', '1.0pre1', '1.0preview1')
+        self.assertSame('1.0a', '1.0a0')
+
+    def test_post_releases(self):
+        self.assertOrdered(['1.0', '1.0.post0', '1.0.post1', '1.0.post2', '1.0.1'])
+        self.assertSame('1.0.post1', '1.0-1', '1.0-post1', '1.0.rev1', '1.0r1')
+        self.assertOrdered(['1.0.post1.dev1', '1.0.post1'])
+
+    def test_local_versions(self):
+        self.assertOrdered(['1.0', '1.0+abc', '1.0+abc.1', '1.0+abc.2', '1.0+1', '1.0+2', '1.0+10', '1.0.post1'])
+        self.assertSame('1.0+ubuntu.1', '1.0+ubuntu-1', '1.0+UBUNTU_1')
+
+    def test_epochs(self):
+        self.assertOrdered(['2013.10', '2014.1', '1!0.1', '1!1.0', '2!0.1'])
+        self.assertSame('1.0', '0!1.0')
+
+    def test_normalization(self):
+        self.assertSame('1.0', 'v1.0', ' 1.0 ', 'V1.0')
+
+    def test_legacy_versions(self):
+        ## Versions which are not valid PEP 440 versions sort before all the valid ones
+        legacy = ['dev-trunk', '1.0-SNAPSHOT', '2.0_final_x', 'foo']
+        for v in legacy:
+            self.assertEqual(version.parse_version(v)[0], 0, v)
+            self.assertLess(version.parse_version(v), version.parse_version('0.0.1.dev0'))
+        self.assertOrdered(['1.0-SNAPSHOT', '1.1-SNAPSHOT', '1.10-SNAPSHOT'])
+        self.assertEqual(version.sort_versions(['1.0', 'dev-trunk', '0.1']), ['dev-trunk', '0.1', '1.0'])
+
+    def test_cached_key(self):
+        key = version.parse_version('3.14.dev15')
+        self.assertIs(version.parse_version('3.14.dev15'), key)
+        self.assertIn('3.14.dev15', version._cache)
+
+    def test_cache_is_bounded(self):
+        size = version._CACHE_SIZE
+        version._CACHE_SIZE = 10
+        try:
+            for i in range(25):
+                version.parse_version('9.{0}'.format(i))
+                self.assertLessEqual(len(version._cache), 10)
+        finally:
+            version._CACHE_SIZE = size
+        self.assertLess(version.parse_version('9.9'), version.parse_version('9.10'))
+
+
+class HelpersTest(unittest.TestCase):
+
+    def test_is_prerelease(self):
+        for v in ('1.0a1', '1.0.dev1', '1.0rc1.post1', '1.0.post1.dev1'):
+            self.assertTrue(version.is_prerelease(v), v)
+        for v in ('1.0', '1.0.post1', '1.0+local', 'dev-trunk'):
+            self.assertFalse(version.is_prerelease(v), v)
+
+    def test_sort_versions(self):
+        self.assertEqual(version.sort_versions(['1.0.9', '1.0.10', '1.0b1', '0.9']),
+                         ['0.9', '1.0b1', '1.0.9', '1.0.10'])
+        self.assertEqual(version.sort_versions(['0.9', '1.0', '1.0b1'], reverse=True), ['1.0', '1.0b1', '0.9'])
+
+    def test_latest(self):
+        self.assertEqual(version.latest(['0.9', '1.0', '1.1b1']), '1.0')
+        self.assertEqual(version.latest(['0.9', '1.0', '1.1b1'], prereleases=True), '1.1b1')
+        self.assertEqual(version.latest(['1.1a1', '1.1b1']), '1.1b1')
+        self.assertIsNone(version.latest([]))
+
+
+if __name__ == '__main__':
+    unittest.main()